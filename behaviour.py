@@ -0,0 +1,94 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# behaviour.py: what gizmo does each frame, as a table of rules
+
+# The behaviour used to be one long if/elif chain in the main loop, with its conditions tangled up with the motor and
+# video calls and copied out again by bench.py. Each behaviour is now a Rule: a name, a priority, a guard (does this
+# rule apply, given gizmo's needs and the dots found in this frame?) and an action. RULES is the table of guards, in
+# the order main.py always checked them; main.py adds the actions. An Engine sorts the rules by priority and compiles
+# the guards into one function - a flat chain of ifs, like the one it replaced - so picking a behaviour costs no more
+# than before, and it times the choice and the action separately. Guards only look at a State, so which rule fires
+# can be checked with made up needs and detections, without any hardware:
+#
+#   Engine(RULES).decide(State(hunger=800, tracked=True))  # the 'hungry' rule
+
+from instrument import timer
+
+
+class State(object):  # everything the guards can look at
+    def __init__(self, dead=False, hunger=0, tiredness=0, boredom=0, count=0, found=None, tracked=False, seen=False,
+                 busy=False):
+        self.dead = dead
+        self.hunger = hunger
+        self.tiredness = tiredness
+        self.boredom = boredom
+        self.count = count  # frames so far
+        self.found = found if found is not None else {}  # {target name: (x, y) or None}
+        self.tracked = tracked  # both of gizmo's own dots were found this frame
+        self.seen = seen  # gizmo has been found at least once
+        self.busy = busy  # an action is still running on the motors
+
+
+class Rule(object):
+    def __init__(self, name, priority, guard, action=None):
+        self.name = name
+        self.priority = priority  # highest is checked first
+        self.guard = guard  # guard(state) - True if the rule applies
+        self.action = action  # action(state) - may change the needs
+
+
+RULES = [
+    Rule('searching', 110, lambda s: not s.tracked and not s.seen),  # until gizmo is found for the first time
+    Rule('lost', 100, lambda s: not s.tracked),
+    Rule('resurrect', 90, lambda s: s.dead and all(s.found.get(n) for n in ('lGreen', 'xsBlue', 'xsRed'))),
+    Rule('die', 80, lambda s: s.tiredness > 1000 and s.hunger > 1000 and s.boredom > 1000),
+    Rule('busy', 70, lambda s: s.busy),  # let the current action finish
+    Rule('dance', 60, lambda s: s.tiredness < 500 and s.boredom > 5 and s.found.get('xsBlue') is not None),
+    Rule('kick', 50, lambda s: s.boredom > 5 and s.found.get('ball') is not None),
+    Rule('sleep', 40, lambda s: s.tiredness > 5 and s.found.get('lGreen') is not None),
+    Rule('eat', 30, lambda s: s.hunger > 2 and s.found.get('xsRed') is not None),
+    Rule('tired', 20, lambda s: s.tiredness > 500),
+    Rule('hungry', 15, lambda s: s.hunger > 700),
+    Rule('bored', 10, lambda s: s.boredom > 250),
+    Rule('idle', 0, lambda s: True),
+]
+
+
+class Engine(object):
+    def __init__(self, rules, actions=None, stats=None):
+        actions = actions or {}
+        self.rules = sorted((Rule(rule.name, rule.priority, rule.guard, actions.get(rule.name, rule.action))
+                             for rule in rules), key=lambda rule: -rule.priority)
+        self.stats = stats  # instrument.Stats - 'rules' for choosing, 'behaviour.<name>' for each action
+        self.last = None  # rule that fired last
+        self.elapsed = 0.0  # seconds the last choice took
+        self.dispatch = self.compile()
+
+    def compile(self):  # one function checking every guard in priority order
+        lines = ['def dispatch(state):']
+        namespace = {}
+        for i, rule in enumerate(self.rules):
+            namespace['guard%d' % i] = rule.guard
+            namespace['rule%d' % i] = rule
+            lines.append('    if guard%d(state): return rule%d' % (i, i))
+        lines.append('    return None')
+        exec('\n'.join(lines), namespace)
+        return namespace['dispatch']
+
+    def decide(self, state):  # the rule that applies - nothing is run
+        start = timer()
+        rule = self.dispatch(state)
+        self.elapsed = timer() - start
+        self.last = rule
+        if self.stats is not None:
+            self.stats.record('rules', self.elapsed)
+        return rule
+
+    def run(self, state):  # choose a rule and run its action
+        rule = self.decide(state)
+        if rule is not None and rule.action is not None:
+            start = timer()
+            rule.action(state)
+            if self.stats is not None:
+                self.stats.record('behaviour.' + rule.name, timer() - start)
+        return rule
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# GIZMO PIXEL - Interactive robotic pet code
+
+# bench.py: how long does each part of a loop iteration take?
+
+# Replays a directory of recorded frames through main.py itself - its detector, behaviour rules and actions - on
+# simulated hardware, and times each stage of the loop separately: reading the frame, finding gizmo's own dots,
+# deciding what to do (which finds any other dots the rules ask for) and running the chosen action, which sends the
+# motor, servo, LED and face commands as main.py does. Reports latency percentiles, frames per second and memory
+# allocated per stage, and can save the results to compare against after a change. Frames can be a directory or a log
+# written by recorder.py. Like simulate.py, main.py is handed its camera, hardware and settings through resident.keep,
+# so nothing needs SimpleCV or a Pi - it runs headless on any Linux machine.
+#
+# Frames are read as fast as main.py asks for them, but main.py runs on clock.py's virtual clock, moved on one frame
+# period (--fps) per frame - so a wiggle keeps gizmo busy for as many frames as it would on the robot, rather than for
+# the whole benchmark, and the rules and the dots they ask for are timed as often as they would really run. The
+# scheduler steps that come due as the clock moves on are timed with the read stage. Needs grow from a fixed seed, so
+# the same frames make the same decisions every run:
+#
+#   python bench.py frames/ --save before.json
+#   python bench.py frames/ --compare before.json
+
+from __future__ import division
+
+import argparse
+import json
+import math
+import os
+import random
+import runpy
+import sys
+import time
+
+import hardware
+import resident
+from camera import Frame
+from clock import clock
+from instrument import Stats, timer
+from recorder import Replay
+
+try:  # allocations are only reported on python 3.9 or newer
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STAGES = {'capture': 'read', 'detect': 'detect', 'rules': 'decide', 'loop': 'loop'}  # main.py's stats: stage
+SETTINGS = {'showAnimation': False, 'showDisplay': False, 'statsFile': None, 'statsSocket': None, 'recordLog': None,
+            'logFile': None, 'logLevel': 'WARNING', 'visionWorkers': 0, 'robotCount': 1}
+
+
+class Stages(Stats):  # main.py's Stats, also keeping every sample of each stage (and what it allocated)
+    def __init__(self, allocs=False):
+        Stats.__init__(self)
+        self.times = {}
+        self.allocs = {}
+        self.order = []
+        self.branches = {}  # how often each behaviour was chosen
+        self.tracing = allocs and hasattr(tracemalloc, 'reset_peak')  # python 3.9 or newer
+        self.memory = 0  # traced memory when the last stage ended
+
+    def record(self, name, seconds):
+        Stats.record(self, name, seconds)
+        if name.startswith('behaviour.'):  # every action is one stage
+            self.branches[name[len('behaviour.'):]] = self.branches.get(name[len('behaviour.'):], 0) + 1
+            name = 'actuate'
+        elif name not in STAGES:  # scheduler commands and single dots, timed within the stages
+            return
+        else:
+            name = STAGES[name]
+        if name not in self.times:
+            self.order.append(name)
+            self.times[name] = []
+            self.allocs[name] = []
+        self.times[name].append(seconds)
+        if self.tracing:  # stages follow each other, so each allocated what was added since the last one ended
+            current, peak = tracemalloc.get_traced_memory()
+            if name != 'loop':  # the whole iteration - the rest of it is counted with the next frame's read
+                self.allocs[name].append(max(peak - self.memory, 0))
+            self.memory = current
+            tracemalloc.reset_peak()
+
+
+class Frames(object):  # stands in for camera.Capture - the recorded frames, each one frame period later
+    def __init__(self, frames, repeat=1, fps=15):
+        self.length, self.load = source(frames)
+        self.total = self.length * repeat
+        self.period = 1 / fps
+        self.number = 0
+        self.started = None  # when the first frame was read - main.py's startup is not part of the benchmark
+        self.finished = None
+
+    def read(self, maxAge=None, after=None, timeout=1.0):
+        if self.number >= self.total:
+            self.finished = timer()
+            raise KeyboardInterrupt  # main.py quits as it does for Ctrl-C
+        if self.started is None:
+            self.started = timer()
+        else:
+            clock.advance(self.period)  # motor commands start and stop on time meanwhile
+        img = self.load(self.number % self.length)
+        self.number += 1
+        return Frame(img, clock.time(), self.number)
+
+    def stop(self):
+        pass
+
+
+def percentile(values, p):  # nearest-rank percentile of a list
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(p / 100 * len(ordered))) - 1)]
+
+
+def summarise(stages, frames, elapsed):
+    results = {'frames': frames, 'fps': frames / elapsed if elapsed else 0, 'stages': {}}
+    for name in stages.order:
+        times = [t * 1000 for t in stages.times[name]]  # milliseconds
+        stage = {'mean': sum(times) / len(times), 'p50': percentile(times, 50), 'p90': percentile(times, 90),
+                 'p99': percentile(times, 99), 'max': max(times)}
+        if stages.allocs[name]:
+            stage['kb'] = sum(stages.allocs[name]) / len(stages.allocs[name]) / 1024
+        results['stages'][name] = stage
+    return results
+
+
+def report(results, previous=None):
+    print('%d frames, %.1f fps' % (results['frames'], results['fps']))
+    if previous:
+        print('(was %.1f fps)' % previous['fps'])
+    print('%-10s %8s %8s %8s %8s %8s %9s' % ('stage', 'mean', 'p50', 'p90', 'p99', 'max', 'kB/frame'))
+    for name, stage in results['stages'].items():
+        line = '%-10s %8.2f %8.2f %8.2f %8.2f %8.2f %9s' % (name, stage['mean'], stage['p50'], stage['p90'],
+                                                       stage['p99'], stage['max'], '%.1f' % stage['kb']
+                                                       if 'kb' in stage else '-')
+        if previous and name in previous['stages']:
+            line += '  p50 %+.2f ms' % (stage['p50'] - previous['stages'][name]['p50'])
+        print(line)
+    print('branches: ' + ', '.join('%s %d' % (name, n) for name, n in sorted(results['branches'].items())))
+
+
+def source(frames):  # (number of frames, function loading frame i as the main loop would see it)
+    if os.path.isfile(frames):
+        replay = Replay(frames)
+        return len(replay), replay.image
+    camera = hardware.ReplayCamera(frames, fps=0, loop=False)
+    return len(camera.paths), lambda i: camera.load(camera.paths[i]).flipHorizontal()
+
+
+def run(frames, backend='numpy', track=False, pyramid=1, repeat=1, allocs=False, fps=15, seed=0):
+    capture = Frames(frames, repeat, fps)
+    stages = Stages(allocs)
+    settings = dict(SETTINGS, numpyVision=backend == 'numpy', trackDots=track, pyramidStep=pyramid)
+    resident.close_all()  # nothing left over from an earlier run in this process
+    sys.modules.pop('utils', None)  # utils takes hw from resident.keep when it is imported - import it afresh
+    resident.active = True  # main.py leaves these alone when it quits
+    clock.simulate()
+    random.seed(seed)  # main.py's needs
+    for name, handle in [('hw', hardware.SimBackend()), ('stats', stages), ('capture', capture),
+                         ('settings', settings)]:
+        resident.keep(name, lambda handle=handle: handle)
+    if stages.tracing:
+        tracemalloc.start()
+    stdout = sys.stdout
+    try:
+        sys.stdout = open(os.devnull, 'w')  # main.py's 'Importing...' lines
+        runpy.run_path(os.path.join(HERE, 'main.py'), run_name='__main__')
+    except SystemExit:  # main.py quit
+        pass
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        if stages.tracing:
+            tracemalloc.stop()
+        resident.active = False
+        resident.close_all()  # main.py's pins and the handles given to it - the next run starts afresh
+        clock.real()
+    results = summarise(stages, capture.number, (capture.finished or timer()) - (capture.started or timer()))
+    results['branches'] = stages.branches
+    results['settings'] = {'backend': backend, 'track': track, 'pyramid': pyramid, 'frames': frames, 'fps': fps,
+                           'seed': seed}
+    results['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time each stage of the control loop over recorded frames')
+    parser.add_argument('frames', help='recorder.py log, or directory of frames (.npy, or images with SimpleCV)')
+    parser.add_argument('--backend', choices=['numpy', 'simplecv'], default='numpy')
+    parser.add_argument('--track', action='store_true', help='search windows around last known dots')
+    parser.add_argument('--pyramid', type=int, default=1, help='coarse search at 1/N resolution')
+    parser.add_argument('--repeat', type=int, default=1, help='play the frames this many times')
+    parser.add_argument('--allocs', action='store_true', help='also measure memory allocated per stage (slower)')
+    parser.add_argument('--fps', type=float, default=15, help="frames per second of gizmo's (virtual) time")
+    parser.add_argument('--seed', type=int, default=0, help="seed for gizmo's needs")
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='show changes against results saved earlier')
+    args = parser.parse_args()
+
+    results = run(args.frames, args.backend, args.track, args.pyramid, args.repeat, args.allocs, args.fps, args.seed)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(results, previous)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,122 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# blobs.py: connected components of a mask, with their area, centre and roundness, as one numpy array
+
+# SimpleCV's findBlobs builds a Python object per blob (with its contour, hull and masks), and the dot filters then ask
+# each one isCircle() and area() in Python loops - in a cluttered frame that overhead is most of the detection time.
+# components() labels the mask and works out every component's statistics with whole-array operations:
+#
+# - the mask is cut into runs of set pixels along each row, and runs on neighbouring rows that touch (diagonals
+#   included, as findBlobs does) are joined by repeatedly giving each run the smallest label of the runs it touches;
+# - each run's moments (pixel count, sums of x, y, x*x, y*y, x*y) have closed forms, so summing them per label gives
+#   every component's area, centroid and second moments, and the runs give its bounding box;
+# - roundness is measured as SimpleCV's isCircle does - how far the blob differs from the circle filling the short
+#   side of its bounding box, as a fraction of that circle's area - and, since a tilted oval can fill a squarish box,
+#   by how much longer its major axis is than its minor one (from the second moments). The larger of the two is the
+#   blob's distance from a circle; isCircle(0.25) becomes circle < 0.25.
+#
+# The result is sorted smallest first, like findBlobs, so picking the last matching row picks the same dot.
+
+from __future__ import division
+
+import numpy  # import numpy
+
+DTYPE = numpy.dtype([('area', numpy.int32), ('x', numpy.float64), ('y', numpy.float64), ('circle', numpy.float64)])
+
+
+def runs(mask):  # (row, start, end) of every run of set pixels along axis 1 - end is exclusive
+    padded = numpy.zeros((mask.shape[0], mask.shape[1] + 2), numpy.int8)
+    padded[:, 1:-1] = mask != 0
+    edges = numpy.diff(padded, axis=1)
+    rows, starts = numpy.nonzero(edges == 1)
+    ends = numpy.nonzero(edges == -1)[1]
+    return rows, starts, ends
+
+
+def touching(rows, starts, ends, width):  # pairs (a, b) of runs on neighbouring rows that touch, b on the row after a
+    startKeys = rows * width + starts  # runs are in row order, then column order, so both keys are sorted
+    endKeys = rows * width + ends
+    first = numpy.searchsorted(endKeys, (rows + 1) * width + starts, 'left')  # next row, ending at or after our start
+    last = numpy.searchsorted(startKeys, (rows + 1) * width + ends, 'right')  # next row, starting at or before our end
+    counts = numpy.maximum(last - first, 0)
+    a = numpy.repeat(numpy.arange(len(rows)), counts)
+    offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    b = numpy.repeat(first, counts) + offsets
+    return a, b
+
+
+def label(count, a, b):  # component label of each of count runs, given the pairs that touch
+    labels = numpy.arange(count)
+    while True:
+        lowest = numpy.minimum(labels[a], labels[b])
+        joined = labels.copy()
+        numpy.minimum.at(joined, labels[a], lowest)  # point each label at the smallest one it touches
+        numpy.minimum.at(joined, labels[b], lowest)
+        while True:  # follow the pointers to the end
+            shorter = joined[joined]
+            if numpy.array_equal(shorter, joined):
+                break
+            joined = shorter
+        if numpy.array_equal(joined, labels):
+            return labels
+        labels = joined
+
+
+def components(mask, minSize=10):  # DTYPE array of every component of at least minSize pixels, smallest first
+    rows, starts, ends = runs(mask)
+    if len(rows) == 0:
+        return numpy.zeros(0, DTYPE)
+    a, b = touching(rows, starts, ends, mask.shape[1] + 2)
+    labels = numpy.unique(label(len(rows), a, b), return_inverse=True)[1]
+    count = labels.max() + 1
+
+    x = rows.astype(numpy.float64)  # axis 0 - SimpleCV's x
+    s = starts.astype(numpy.float64)  # axis 1 - y, from s to e - 1
+    e = ends.astype(numpy.float64) - 1
+    n = e - s + 1
+    sumY = (s + e) * n / 2
+    sumYY = (e * (e + 1) * (2 * e + 1) - (s - 1) * s * (2 * s - 1)) / 6
+    m00 = numpy.bincount(labels, n, count)
+    m10 = numpy.bincount(labels, x * n, count)
+    m01 = numpy.bincount(labels, sumY, count)
+    m20 = numpy.bincount(labels, x * x * n, count)
+    m02 = numpy.bincount(labels, sumYY, count)
+    m11 = numpy.bincount(labels, x * sumY, count)
+
+    cx = m10 / m00
+    cy = m01 / m00
+    mu20 = m20 / m00 - cx * cx + 1 / 12  # variances, counting each pixel as a unit square
+    mu02 = m02 / m00 - cy * cy + 1 / 12
+    mu11 = m11 / m00 - cx * cy
+    spread = numpy.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+    major = (mu20 + mu02) / 2 + spread
+    minor = (mu20 + mu02) / 2 - spread
+    elongation = numpy.sqrt(major / numpy.maximum(minor, 1e-12)) - 1  # major axis / minor axis - 1
+
+    low = numpy.full(count, numpy.inf)
+    high = numpy.full(count, -numpy.inf)
+    numpy.minimum.at(low, labels, x)
+    numpy.maximum.at(high, labels, x)
+    width = high - low + 1
+    top = numpy.full(count, numpy.inf)
+    bottom = numpy.full(count, -numpy.inf)
+    numpy.minimum.at(top, labels, s)
+    numpy.maximum.at(bottom, labels, e)
+    height = bottom - top + 1
+    circleArea = numpy.pi * (numpy.minimum(width, height) / 2) ** 2
+    fill = numpy.abs(m00 - circleArea) / circleArea
+
+    result = numpy.zeros(count, DTYPE)
+    result['area'] = m00
+    result['x'] = cx
+    result['y'] = cy
+    result['circle'] = numpy.maximum(fill, elongation)
+    result = result[result['area'] >= minSize]
+    return result[numpy.argsort(result['area'], kind='mergesort')]
+
+
+def from_simplecv(blobs):  # the same array from SimpleCV blobs, for SimpleCV segmentation
+    result = numpy.zeros(len(blobs) if blobs else 0, DTYPE)
+    for i, blob in enumerate(blobs or []):
+        result[i] = (blob.area(), blob.x, blob.y, blob.circleDistance())
+    return result
@@ -0,0 +1,87 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# camera.py: background webcam capture, so the main loop never waits on the USB camera
+
+# cam.getImage() blocks until the driver hands over a frame, and while Gizmo is busy (eating, dancing) old frames pile
+# up in the driver so the next getImage() returns a picture of the past. Capture runs the camera on its own thread,
+# flips each image as it arrives and keeps only the last few frames, each stamped with the time it was taken.
+
+import collections
+import threading
+import time
+
+from clock import clock
+
+
+class Frame(object):  # one captured image and when it was taken
+    def __init__(self, img, timestamp, number):
+        self.img = img
+        self.timestamp = timestamp
+        self.number = number  # increases by one per captured frame
+
+    def age(self):  # seconds since the frame was captured
+        return clock.time() - self.timestamp
+
+
+class Capture(object):
+    def __init__(self, cam, size=3, flip=True):
+        self.cam = cam  # SimpleCV.Camera (or anything with getImage)
+        self.flip = flip  # flip horizontally off the main loop, as main.py always did
+        self.frames = collections.deque(maxlen=size)  # ring buffer - oldest frames drop off the end
+        self.number = 0
+        self.error = None
+        self.lock = threading.Condition()
+        self.running = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, name='camera')
+        self.thread.daemon = True  # don't keep python alive after the main loop quits
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join(1)
+
+    def run(self):
+        while self.running.is_set():
+            try:
+                img = self.cam.getImage()
+                timestamp = clock.time()
+                if self.flip:
+                    img = img.flipHorizontal()
+            except Exception as e:  # keep capturing through the odd bad read from the webcam
+                self.error = e
+                time.sleep(0.1)
+                continue
+            with self.lock:
+                self.number += 1
+                self.frames.append(Frame(img, timestamp, self.number))
+                self.lock.notify_all()
+
+    def latest(self):  # newest frame without waiting, or None if nothing has been captured yet
+        with self.lock:
+            if self.frames:
+                return self.frames[-1]
+            return None
+
+    def recent(self):  # every buffered frame, oldest first
+        with self.lock:
+            return list(self.frames)
+
+    def read(self, maxAge=None, after=None, timeout=1.0):  # newest frame, only waiting if it is too old or already seen
+        deadline = time.time() + timeout
+        with self.lock:
+            while True:
+                frame = self.frames[-1] if self.frames else None
+                fresh = frame is not None and (maxAge is None or frame.age() <= maxAge)
+                unseen = frame is not None and (after is None or frame.number > after.number)
+                if fresh and unseen:
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None  # camera has stalled - let the caller decide what to do
+                self.lock.wait(remaining)
@@ -0,0 +1,52 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# clock.py: the time gizmo's behaviour runs on - real time, or virtual time for simulate.py
+
+# Gizmo's needs grow every frame and its actions are timed motor commands, so finding out what it does over a day means
+# waiting a day. Everything that decides what happens and when - the scheduler's holds, the heading controller, frame
+# timestamps and the simulated pins - asks this clock for the time instead of the time module. Normally it is just the
+# real time. Once simulate.py switches it to virtual time, time stands still until advance() moves it on, and waiting
+# is done by booking a callback for a later time with at() - advance() runs the callbacks in time order, so a whole
+# day of commands runs as fast as the code can go, and the same way every time.
+
+import heapq
+import itertools
+import time
+
+
+class Clock(object):
+    def __init__(self):
+        self.virtual = False
+        self.now = 0.0  # virtual time, in seconds
+        self.events = []  # (time, order, callback) booked with at() - a heap
+        self.order = itertools.count()  # callbacks booked for the same time run in the order they were booked
+
+    def time(self):  # seconds, like time.time()
+        return self.now if self.virtual else time.time()
+
+    def simulate(self, start=0.0):  # switch to virtual time, starting at start
+        self.virtual = True
+        self.now = start
+        self.events = []
+
+    def real(self):  # back to real time, dropping any callbacks still booked
+        self.virtual = False
+        self.events = []
+
+    def at(self, when, callback):  # virtual time only - call callback() once the clock reaches when
+        heapq.heappush(self.events, (when, next(self.order), callback))
+
+    def advance(self, seconds, step=None):  # move virtual time on, running callbacks as their time comes
+        end = self.now + seconds
+        while self.events and self.events[0][0] <= end:
+            when, order, callback = heapq.heappop(self.events)
+            if step is not None and when > self.now:
+                step(when - self.now)  # step(seconds) - whatever moves with time, up to this callback
+            self.now = max(self.now, when)
+            callback()
+        if step is not None and end > self.now:
+            step(end - self.now)
+        self.now = end
+
+
+clock = Clock()  # the one clock everything shares
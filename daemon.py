@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# GIZMO PIXEL - Interactive robotic pet code
+
+# daemon.py: keep gizmo's hardware open and run main.py again whenever it crashes or its code changes
+
+# A cold start imports SimpleCV, numpy and the hardware libraries and opens the camera, the pins, the LEDs and the face
+# players - long enough on a Pi that trying out a change to the behaviour means a long wait. The daemon runs main.py
+# in its own process with resident.active set, so every handle main.py opens through resident.keep stays open. When
+# main.py crashes, or the daemon is sent SIGHUP (or, with --watch, when a .py file changes), main.py is asked to stop
+# through resident.stopping and quits its loop at the next frame, tidying up as it does for Ctrl-C - the signal handler
+# only sets a flag, so it can't break into that tidying up half way. Then gizmo's own modules are forgotten so they are
+# imported afresh, and main.py runs again - on the same camera, pins and players, with the big libraries already
+# loaded. Ctrl-C quits for good and closes everything.
+#
+#   python daemon.py --watch
+#   kill -HUP <pid>  # reload by hand
+
+import argparse
+import glob
+import os
+import runpy
+import signal
+import sys
+import threading
+import time
+import traceback
+
+import resident
+from logger import log
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KEEP = ['resident', 'logger']  # modules holding state that has to survive a reload
+
+
+class Daemon(object):
+    def __init__(self, path, watch=False, delay=1.0):
+        self.path = path  # script to run - main.py
+        self.watch = watch  # reload when a .py file changes
+        self.delay = delay  # seconds to wait after a crash before running again
+        self.requested = False  # a reload has been asked for
+        self.runs = 0
+
+    def reload(self, signum=None, frame=None):  # SIGHUP
+        self.requested = True
+        resident.stopping.set()  # main.py checks this between frames
+
+    def unload(self):  # forget gizmo's own modules, so running main.py imports the new code
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None)
+            if name not in KEEP and path and os.path.dirname(os.path.abspath(path)) == HERE:
+                del sys.modules[name]
+
+    def modified(self):  # {path: modification time} of every .py file
+        return dict((path, os.path.getmtime(path)) for path in glob.glob(os.path.join(HERE, '*.py')))
+
+    def watcher(self):
+        last = self.modified()
+        while True:
+            time.sleep(1)
+            current = self.modified()
+            if current != last:
+                last = current
+                os.kill(os.getpid(), signal.SIGHUP)
+
+    def run(self):
+        resident.active = True
+        signal.signal(signal.SIGHUP, self.reload)
+        if self.watch:
+            thread = threading.Thread(target=self.watcher, name='watcher')
+            thread.daemon = True
+            thread.start()
+        while True:
+            if self.runs:
+                log.info('Reloading', runs=self.runs)
+                self.unload()
+            self.requested = False
+            resident.stopping.clear()
+            self.runs += 1
+            crashed = False
+            try:
+                runpy.run_path(self.path, run_name='__main__')
+            except SystemExit:  # main.py quit, or stopped to be reloaded
+                pass
+            except KeyboardInterrupt:  # Ctrl-C before main.py's loop had started
+                break
+            except Exception:
+                crashed = True
+                log.error('main.py crashed', error=traceback.format_exc())
+            if crashed:
+                time.sleep(self.delay)
+            elif not self.requested:
+                break  # quit for good
+        resident.active = False
+        resident.close_all()
+        log.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run main.py, restarting it without closing the hardware')
+    parser.add_argument('--watch', action='store_true', help='reload whenever a .py file changes')
+    parser.add_argument('--delay', type=float, default=1.0, help='seconds to wait after a crash before restarting')
+    args = parser.parse_args()
+    Daemon(os.path.join(HERE, 'main.py'), args.watch, args.delay).run()
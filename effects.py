@@ -0,0 +1,131 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# effects.py: LED animations that play on their own thread
+
+# The disco routine flashed the LEDs from the same command that drove the motors, one colour change per step, and
+# nothing smoother than a flash was possible. An Effect is a description of an animation - keyframes of (seconds,
+# colours), where colours is one colour for the whole strip or one per LED (a shorter list repeats along the strip),
+# faded between or stepped - and fade, pulse, chase and cycle build the common ones. Effects plays one at a time on a
+# background thread at a fixed refresh rate, so behaviour code just starts and stops them. Each effect's frames are
+# packed once, the first time it plays, and the Strip only writes frames that differ from what is already showing.
+
+from __future__ import division
+
+import threading
+
+from instrument import timer
+
+
+class Effect(object):
+    def __init__(self, keyframes, loop=False, blend=True):
+        self.keyframes = sorted((float(t), colours) for t, colours in keyframes)  # (seconds, colour or colours)
+        self.loop = loop  # start again from the first keyframe after the last
+        self.blend = blend  # fade between keyframes, or hold each until the next
+        self.length = self.keyframes[-1][0]
+        self.frames = {}  # (strip size, rate): packed frames, built the first time the effect plays
+
+    def colours(self, t, size):  # colour of each LED t seconds in
+        before = self.keyframes[0]
+        after = before
+        for keyframe in self.keyframes:
+            if keyframe[0] > t:
+                after = keyframe
+                break
+            before = after = keyframe
+        start, end = expand(before[1], size), expand(after[1], size)
+        if not self.blend or after[0] == before[0]:
+            return start
+        f = (t - before[0]) / (after[0] - before[0])
+        return [tuple(int(round(a + (b - a) * f)) for a, b in zip(x, y)) for x, y in zip(start, end)]
+
+    def render(self, strip, rate):  # every frame of the effect, packed for the strip
+        key = (strip.size, rate)
+        if key not in self.frames:
+            count = max(1, int(round(self.length * rate)) + (0 if self.loop else 1))
+            self.frames[key] = [strip.frame(self.colours(i / rate, strip.size)) for i in range(count)]
+        return self.frames[key]
+
+
+def expand(colours, size):  # one colour, or a list of them, to one per LED
+    if isinstance(colours, tuple):
+        colours = [colours]
+    return [tuple(colours[i % len(colours)]) for i in range(size)]
+
+
+def fade(start, end, length):  # from one colour to another
+    return Effect([(0, start), (length, end)])
+
+
+def pulse(colour, period=2.0, low=(0, 0, 0)):  # breathe up and down, forever
+    return Effect([(0, low), (period / 2, colour), (period, low)], loop=True)
+
+
+def chase(colour, size, period=1.0, width=2, background=(0, 0, 0)):  # a block of LEDs running along the strip
+    step = period / size
+    keyframes = [(i * step, [colour if (n - i) % size < width else background for n in range(size)])
+                 for i in range(size)]
+    return Effect(keyframes + [(period, keyframes[0][1])], loop=True, blend=False)
+
+
+def cycle(colours, hold=0.5, loop=True):  # flash through a list of colours
+    keyframes = [(i * hold, colour) for i, colour in enumerate(colours)]
+    return Effect(keyframes + [(len(colours) * hold, colours[0] if loop else colours[-1])], loop=loop, blend=False)
+
+
+class Effects(object):  # plays effects on a strip from a background thread
+    def __init__(self, strip, rate=30):
+        self.strip = strip
+        self.rate = rate  # frames per second
+        self.effect = None
+        self.started = None
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='effects')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def play(self, effect):  # replace whatever is playing
+        with self.condition:
+            self.effect = effect
+            self.started = timer()
+            self.condition.notify()
+
+    def stop(self, colour=(0, 0, 0)):  # stop the effect and set the whole strip to colour
+        with self.condition:
+            self.effect = None
+            self.strip.fill(colour)
+            self.strip.show()
+
+    def playing(self):
+        return self.effect is not None
+
+    def shutdown(self):  # stop the thread - the strip is left as it is
+        with self.condition:
+            self.running = False
+            self.effect = None
+            self.condition.notify()
+        self.thread.join(1)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.effect is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                effect = self.effect
+            frames = effect.render(self.strip, self.rate)  # only slow the first time an effect plays
+            with self.condition:
+                if self.effect is not effect:  # stopped or replaced meanwhile
+                    continue
+                tick = int((timer() - self.started) * self.rate)
+                if effect.loop:
+                    i = tick % len(frames)
+                else:
+                    i = min(tick, len(frames) - 1)
+                    if i == len(frames) - 1:  # finished - leave the last frame showing
+                        self.effect = None
+                self.strip.load(frames[i])
+                self.strip.show()  # skipped when the frame hasn't changed
+                if self.effect is effect:  # sleep until the next frame is due, or until a new effect starts
+                    self.condition.wait(max(0, self.started + (tick + 1) / self.rate - timer()))
@@ -0,0 +1,255 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# face.py: keeps the face animation players running instead of starting a new one for every change of face
+
+# change_video used to quit omxplayer and start a new one for every face, so each change cost a process start (a
+# second or more on the Pi) with a blank screen while it loaded - and omxplayer falling over on quit was the main reason
+# for all the try/excepts. Face keeps one omxplayer per clip, started paused, looping and fully transparent. Showing a
+# face seeks its player back to the start, makes it visible and plays it; the old face is paused and hidden again. The
+# common faces are started up front; any other clip is started on a background thread the first time it is asked for
+# (the current face stays up until it is ready) and the least recently shown of those is quit when the pool is full.
+# The same thread checks every player every few seconds and restarts any that have crashed, so the control loop never
+# waits for omxplayer. A clip counts as finished once it has played through once - it is then paused on its last frame.
+#
+# try_video asks whether the face has finished on most frames. Each Clip knows its length and when it was shown, so
+# that is answered from the clock - omxplayer is only asked for its position (a D-Bus round trip) in the last moments
+# of a clip, to catch the exact end, and by the health check, which also corrects the start time for any drift. Both
+# ask without holding the lock, so a hung omxplayer only holds up the caller that asked it.
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+from logger import log
+
+END = 0.1  # seconds - a clip this close to its end has finished
+MARGIN = 0.5  # seconds - ask omxplayer where it is when a clip is this close to its expected end
+
+
+class Clip(object):  # one omxplayer, kept running for one video
+    def __init__(self, path, player, duration):
+        self.path = path
+        self.player = player
+        self.duration = duration
+        self.started = 0.0  # time.time() when position 0 was (or would have been) on screen
+        self.finished = True
+        self.shown = 0  # when it was last shown, in face changes - for choosing which clip to quit
+
+    def show(self):  # play from the start, on top
+        self.player.set_position(0)
+        self.player.set_alpha(255)
+        self.player.play()
+        self.started = time.time()
+        self.finished = False
+
+    def hide(self):
+        self.player.pause()
+        self.player.set_alpha(0)
+
+    def near_end(self):  # close enough to the end that omxplayer has to be asked where it is
+        return not self.finished and self.duration - MARGIN <= time.time() - self.started < self.duration
+
+    def playing(self, position=None):  # still on its first time through - from the clock until it is nearly over
+        if self.finished:
+            return False
+        elapsed = time.time() - self.started
+        if elapsed < self.duration - MARGIN:
+            return True
+        if elapsed < self.duration:
+            if position is not None:  # close to the end - omxplayer's position, asked for by Face.playing
+                self.sync(position)
+        else:
+            self.end()
+        return not self.finished
+
+    def sync(self, position):  # correct the start time from omxplayer's position, ending the clip if it is over
+        if self.finished:
+            return
+        if position >= self.duration - END or (time.time() - self.started >= self.duration - MARGIN and
+                                                position < self.duration / 2):  # at the end, or looped back round
+            self.end()
+        else:
+            self.started = time.time() - position
+
+    def end(self):
+        self.player.pause()  # hold the frame, as omxplayer did when it ended
+        self.finished = True
+
+    def alive(self):  # omxplayer's D-Bus calls raise once its process has gone
+        self.player.duration()
+
+
+class Face(object):
+    def __init__(self, hw, prewarm=(), size=5, window=(1, 1, 719, 479), check=5.0):
+        self.hw = hw
+        self.prewarm = list(prewarm)  # clips kept running all the time
+        self.size = max(size, len(self.prewarm))  # most players running at once
+        self.window = window  # video coords, 1 pixel in from edges of screen
+        self.checkInterval = check  # seconds between health checks
+        self.lock = threading.Lock()
+        self.clips = {}  # path: Clip, for every running player
+        self.current = None  # Clip on screen
+        self.wanted = None  # path to show as soon as its player is ready
+        self.loading = set()  # paths queued for the background thread
+        self.changes = 0
+        self.names = 0
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='face')
+        self.thread.daemon = True
+        self.thread.start()
+        for path in self.prewarm:
+            self.load(path)
+
+    def change(self, path):  # show path now (or as soon as it has loaded), from the start
+        with self.lock:
+            clip = self.clips.get(path)
+            if clip is None:
+                self.wanted = path
+                self.load(path)
+                return
+            self.wanted = None
+            self.switch(clip)
+
+    def try_change(self, path):  # show path only if the current face has finished
+        if not self.playing():
+            self.change(path)
+
+    def playing(self):
+        with self.lock:
+            current = self.current
+            if current is None:
+                return False
+            near = current.near_end()
+        position = None
+        if near:  # D-Bus call, without the lock - change() and the control loop never wait for it, even if it hangs
+            try:
+                position = current.player.position()
+            except Exception:  # crashed - the background thread will restart it
+                with self.lock:
+                    if self.clips.get(current.path) is current:
+                        self.failed(current)
+                return False
+        with self.lock:
+            if self.current is not current:  # changed meanwhile - the new face has only just started
+                return self.current is not None
+            try:
+                return current.playing(position)
+            except Exception:
+                self.failed(current)
+                return False
+
+    def stop(self):  # hide the current face
+        with self.lock:
+            if self.current is not None:
+                try:
+                    self.current.hide()
+                except Exception:
+                    self.failed(self.current)
+                self.current = None
+
+    def quit(self):  # quit every player
+        self.tasks.put(None)
+        self.thread.join(5)
+        with self.lock:
+            clips = list(self.clips.values())
+            self.clips = {}
+            self.current = None
+        for clip in clips:
+            try:
+                clip.player.quit()
+            except Exception:  # error handling required because video player runs very poorly, often breaks
+                log.warning('No video playing to quit', path=clip.path)
+
+    def switch(self, clip):  # with the lock held
+        previous = self.current
+        try:
+            clip.show()
+        except Exception:
+            self.failed(clip)
+            return
+        self.current = clip
+        self.changes += 1
+        clip.shown = self.changes
+        if previous is not None and previous is not clip:
+            try:
+                previous.hide()  # after the new face is up, so the screen is never blank
+            except Exception:
+                self.failed(previous)
+
+    def failed(self, clip):  # with the lock held - forget a crashed player and start it again in the background
+        log.warning('Video player crashed, restarting', path=clip.path)
+        if self.clips.get(clip.path) is clip:
+            del self.clips[clip.path]
+        if self.current is clip:
+            self.current = None
+        if clip.path in self.prewarm or clip.path == self.wanted:
+            self.load(clip.path)
+
+    def load(self, path):  # queue a player to be started for path
+        if path not in self.loading:
+            self.loading.add(path)
+            self.tasks.put(path)
+
+    def start(self, path):  # background thread - start a player, then add it to the pool
+        self.names += 1
+        player = self.hw.player(path, args=['--loop', '--no-osd', '--alpha', '0'],
+                                name='org.mpris.MediaPlayer2.omxplayer%d' % self.names, pause=True)
+        player.set_video_pos(*self.window)
+        clip = Clip(path, player, player.duration())
+        evicted = []
+        with self.lock:
+            self.loading.discard(path)
+            self.clips[path] = clip
+            spare = sorted((c for c in self.clips.values() if c.path not in self.prewarm and c is not self.current
+                            and c is not clip), key=lambda c: c.shown)
+            while len(self.clips) > self.size and spare:
+                evicted.append(self.clips.pop(spare.pop(0).path))
+            if self.wanted == path:
+                self.wanted = None
+                self.switch(clip)
+        for old in evicted:
+            try:
+                old.player.quit()
+            except Exception:
+                pass
+
+    def check(self):  # background thread - restart any player that has died
+        with self.lock:
+            clips = list(self.clips.values())
+            current = self.current
+        position = None
+        dead = []
+        for clip in clips:  # D-Bus calls, without the lock - try_video never waits for them, even if one hangs
+            try:
+                if clip is current:
+                    position = clip.player.position()  # also keeps the cached start time honest
+                else:
+                    clip.alive()
+            except Exception:
+                dead.append(clip)
+        with self.lock:
+            if position is not None and self.current is current:
+                current.sync(position)
+            for clip in dead:
+                if self.clips.get(clip.path) is clip:  # not already restarted or quit meanwhile
+                    self.failed(clip)
+
+    def run(self):
+        while True:
+            try:
+                path = self.tasks.get(timeout=self.checkInterval)
+            except queue.Empty:
+                self.check()
+                continue
+            if path is None:
+                break
+            try:
+                self.start(path)
+            except Exception as e:  # leave it to the next request for this clip
+                with self.lock:
+                    self.loading.discard(path)
+                log.error('Could not start video player', path=path, error=e)
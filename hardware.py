@@ -0,0 +1,355 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# hardware.py: everything gizmo touches in the real world, either on the Pi or simulated
+
+# main.py used to import RPi.GPIO, SimpleCV, Adafruit_WS2801 and omxplayer directly, so none of it could run anywhere but
+# on the robot. A backend gives the rest of the code the same handful of things - GPIO (pins and PWM), the LED strip,
+# the camera and the face video player. PiBackend hands out the real libraries; SimBackend hands out stand-ins that
+# record what was written to them and a camera that replays recorded frames or draws a scene of coloured dots, so the
+# control loop can be run, profiled and regression tested on an ordinary Linux machine. Choose with GIZMO_HARDWARE=sim.
+# The slow libraries - SimpleCV, the LED driver and omxplayer - are only imported once the camera, the LEDs or the face
+# are first opened, so the rest of startup doesn't wait for them.
+
+import collections
+import glob
+import math
+import os
+import time
+
+import numpy  # import numpy
+
+from clock import clock
+
+SimpleCV = None  # imported by simplecv() the first time it is needed - it takes seconds to load on the Pi
+
+
+class PiBackend(object):  # the real robot
+    name = 'pi'
+
+    def __init__(self):
+        print('Importing GPIO...')  # import GPIO control
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+
+    def camera(self, size=None):  # size (width, height) - the webcam's default resolution if None
+        print('Importing SimpleCV...')  # import optical tracking - only once the camera is opened
+        if size is None:
+            return simplecv().Camera()
+        return simplecv().Camera(prop_set={'width': size[0], 'height': size[1]})
+
+    def pixels(self, count, clk, do):
+        print('Importing LED driver...')
+        import Adafruit_WS2801  # import LED drivers - only once the LEDs are set up
+        return Adafruit_WS2801.WS2801Pixels(count, clk=clk, do=do)
+
+    def rgb_to_color(self, r, g, b):  # packed colour word for set_pixel
+        import Adafruit_WS2801
+        return Adafruit_WS2801.RGB_to_color(r, g, b)
+
+    def show_frame(self, pixels, frame):  # write a whole frame of RGB bytes in one SPI transfer
+        if hasattr(pixels, '_pixels'):  # WS2801Pixels sends its RGB bytearray as one write
+            pixels._pixels[:] = frame
+        else:
+            for n in range(pixels.count()):
+                pixels.set_pixel_rgb(n, frame[3 * n], frame[3 * n + 1], frame[3 * n + 2])
+        pixels.show()
+
+    def player(self, path, args=None, name=None, pause=False):  # start an omxplayer for a face animation
+        print('Importing OMXPLAYER...')  # import video player
+        from omxplayer.player import OMXPlayer
+        from pathlib import Path
+        if name is None:
+            return OMXPlayer(Path(path), args=args, pause=pause)
+        return OMXPlayer(Path(path), args=args, dbus_name=name, pause=pause)  # own D-Bus name so several can run
+
+
+# SIMULATION
+
+class SimPWM(object):  # RPi.GPIO.PWM stand-in - remembers every duty cycle it was given
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0
+        self.running = False
+
+    def start(self, duty):
+        self.running = True
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        self.gpio.record(self.pin, ('pwm', duty))
+
+    def stop(self):
+        self.running = False
+
+
+class SimGPIO(object):  # RPi.GPIO stand-in - records every write with the time it happened
+    BCM = 'BCM'
+    OUT = 'OUT'
+    IN = 'IN'
+
+    def __init__(self, history=10000):
+        self.pins = {}  # current value of every pin that has been set up
+        self.writes = collections.deque(maxlen=history)  # (time, pin, value), oldest dropped first
+        self.mode = None
+
+    def record(self, pin, value):
+        self.pins[pin] = value
+        self.writes.append((clock.time(), pin, value))
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction):
+        self.pins[pin] = False
+
+    def output(self, pin, value):
+        self.record(pin, bool(value))
+
+    def PWM(self, pin, frequency):
+        return SimPWM(self, pin, frequency)
+
+    def cleanup(self):
+        self.pins = {}
+
+
+class SimPixels(object):  # WS2801Pixels stand-in - keeps the colours and every frame shown
+    def __init__(self, count, history=1000):
+        self.colours = [0] * count
+        self.shown = collections.deque(maxlen=history)  # (time, colours) for every show()
+
+    def count(self):
+        return len(self.colours)
+
+    def set_pixel(self, n, colour):
+        self.colours[n] = colour
+
+    def show(self):
+        self.shown.append((clock.time(), list(self.colours)))
+
+    def write(self, frame):  # a whole frame of RGB bytes at once
+        self.colours = [frame[i] << 16 | frame[i + 1] << 8 | frame[i + 2] for i in range(0, len(frame), 3)]
+        self.show()
+
+    def clear(self):
+        self.colours = [0] * len(self.colours)
+
+
+class SimPlayerEnded(Exception):  # what omxplayer does when asked about a video that has finished
+    pass
+
+
+class SimPlayer(object):  # OMXPlayer stand-in - 'plays' for a fixed length of time, then its process 'exits' (or loops)
+    def __init__(self, path, duration=5.0, args=None, pause=False):
+        args = list(args or [])
+        self.path = path
+        self.length = duration
+        self.loop = '--loop' in args  # omxplayer's --loop
+        self.offset = 0.0  # position when last paused or seeked
+        self.started = None if pause else time.time()  # None while paused
+        self.alpha = int(args[args.index('--alpha') + 1]) if '--alpha' in args else 255
+        self.quit_called = False
+
+    def check(self):  # raise like omxplayer's D-Bus calls do once the process has gone
+        if self.quit_called or (not self.loop and self.elapsed() >= self.length):
+            raise SimPlayerEnded(self.path)
+
+    def elapsed(self):  # seconds into the video
+        if self.started is None:
+            return self.offset
+        elapsed = self.offset + time.time() - self.started
+        return elapsed % self.length if self.loop else min(elapsed, self.length)
+
+    def position(self):
+        self.check()
+        return self.elapsed()
+
+    def duration(self):
+        self.check()
+        return self.length
+
+    def set_video_pos(self, x1, y1, x2, y2):
+        pass
+
+    def set_alpha(self, alpha):
+        self.check()
+        self.alpha = alpha
+
+    def set_position(self, position):
+        self.check()
+        self.offset = position
+        if self.started is not None:
+            self.started = time.time()
+
+    def play(self):
+        self.check()
+        if self.started is None:
+            self.started = time.time()
+
+    def pause(self):
+        self.check()
+        self.offset = self.elapsed()
+        self.started = None
+
+    def is_playing(self):
+        self.check()
+        return self.started is not None
+
+    def quit(self):
+        if self.quit_called:
+            raise SimPlayerEnded(self.path)
+        self.quit_called = True
+
+
+class SimImage(object):  # just enough of a SimpleCV image around a numpy frame, for when SimpleCV isn't installed
+    def __init__(self, frame):
+        self.frame = frame  # indexed [x, y, rgb] like SimpleCV's getNumpy
+        self.width = frame.shape[0]
+        self.height = frame.shape[1]
+
+    def getNumpy(self):
+        return self.frame
+
+    def flipHorizontal(self):
+        return SimImage(self.frame[::-1])
+
+
+def simplecv():  # the SimpleCV module, or None if it isn't installed
+    global SimpleCV
+    if SimpleCV is None:
+        try:
+            import SimpleCV as module
+        except ImportError:
+            module = False  # not installed - don't look for it again
+        SimpleCV = module
+    return SimpleCV or None
+
+
+def to_image(frame):  # numpy frame as the same kind of image SimpleCV.Camera would give
+    if simplecv() is not None:
+        return SimpleCV.Image(numpy.ascontiguousarray(frame))
+    return SimImage(frame)
+
+
+class SceneCamera(object):  # draws coloured dots on a plain background - a synthetic enclosure
+    def __init__(self, width=640, height=480, background=(200, 200, 200), fps=15):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.fps = fps  # getImage waits like a real webcam does
+        self.dots = collections.OrderedDict()  # name: (colour, (x, y), radius)
+        self.last = None
+        xs = numpy.arange(width).reshape(-1, 1)
+        ys = numpy.arange(height).reshape(1, -1)
+        self.grid = (xs, ys)
+
+    def place(self, name, colour, coords, area):  # put a dot of a given area (pixels) at coords
+        self.dots[name] = (colour, coords, math.sqrt(area / math.pi))
+
+    def remove(self, name):
+        self.dots.pop(name, None)
+
+    def render(self):
+        frame = numpy.empty((self.width, self.height, 3), numpy.uint8)
+        frame[...] = self.background
+        xs, ys = self.grid
+        for colour, coords, radius in self.dots.values():  # only the square around each dot
+            x0, x1 = max(0, int(coords[0] - radius)), max(0, int(coords[0] + radius) + 1)
+            y0, y1 = max(0, int(coords[1] - radius)), max(0, int(coords[1] + radius) + 1)
+            inside = (xs[x0:x1] - coords[0]) ** 2 + (ys[:, y0:y1] - coords[1]) ** 2 <= radius ** 2
+            frame[x0:x1, y0:y1][inside] = colour
+        return frame[::-1]  # mirrored, as the overhead webcam sees it - main.py flips it back
+
+    def getImage(self):
+        if self.fps and self.last is not None:
+            wait = self.last + 1.0 / self.fps - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        self.last = time.time()
+        return to_image(self.render())
+
+
+class ReplayCamera(object):  # plays back a directory of recorded frames (.npy arrays, or images if SimpleCV is here)
+    def __init__(self, directory, fps=15, loop=True):
+        self.paths = sorted(glob.glob(os.path.join(directory, '*')))
+        if not self.paths:
+            raise IOError('No frames in ' + directory)
+        self.fps = fps
+        self.loop = loop
+        self.index = 0
+        self.last = None
+
+    def load(self, path):
+        if path.endswith('.npy'):
+            return to_image(numpy.load(path))
+        if simplecv() is None:
+            raise IOError('SimpleCV is needed to read ' + path)
+        return SimpleCV.Image(path)
+
+    def getImage(self):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                raise IOError('End of recorded frames')
+            self.index = 0
+        if self.fps and self.last is not None:
+            wait = self.last + 1.0 / self.fps - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        self.last = time.time()
+        img = self.load(self.paths[self.index])
+        self.index += 1
+        return img
+
+
+def default_scene(size=(640, 480)):  # gizmo sitting in the middle of the box, facing right
+    scene = SceneCamera(size[0], size[1])
+    scene.place('lBlue', (0, 0, 255), (size[0] // 2, size[1] // 2), 5500)
+    scene.place('sBlue', (0, 0, 255), (size[0] // 2 - 70, size[1] // 2), 2200)
+    return scene
+
+
+class SimBackend(object):  # an imaginary robot that behaves like the real one
+    name = 'sim'
+
+    def __init__(self, frames=None, videoLength=5.0):
+        self.GPIO = SimGPIO()
+        self.frames = frames  # directory of recorded frames, or None for the synthetic scene
+        self.videoLength = videoLength
+        self.strip = None
+        self.scene = None
+
+    def camera(self, size=None):  # size only applies to the synthetic scene - recorded frames are as they were
+        if self.frames and os.path.isfile(self.frames):  # a log written by recorder.py
+            from recorder import LogCamera
+            return LogCamera(self.frames)
+        if self.frames:
+            return ReplayCamera(self.frames)
+        self.scene = default_scene(size or (640, 480))  # kept so tests and simulations can move dots around
+        return self.scene
+
+    def pixels(self, count, clk, do):
+        self.strip = SimPixels(count)
+        return self.strip
+
+    def rgb_to_color(self, r, g, b):  # same packing as Adafruit_WS2801.RGB_to_color
+        return ((r & 0xFF) << 16) | ((g & 0xFF) << 8) | (b & 0xFF)
+
+    def show_frame(self, pixels, frame):
+        pixels.write(frame)
+
+    def player(self, path, args=None, name=None, pause=False):
+        return SimPlayer(path, self.videoLength, args, pause)
+
+
+def load(name=None):  # backend chosen by name, or by GIZMO_HARDWARE (default: the real Pi)
+    name = name or os.environ.get('GIZMO_HARDWARE', 'pi')
+    if name == 'pi':
+        return PiBackend()
+    if name == 'sim':
+        return SimBackend(frames=os.environ.get('GIZMO_FRAMES'))
+    raise ValueError('Unknown hardware backend: ' + name)
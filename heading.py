@@ -0,0 +1,57 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# heading.py: closed loop turning towards a target
+
+# move_angle used to spin at a fixed speed for 0.3 or 0.05 seconds depending on how far off the target was, then wait
+# for a whole new frame - so turning to face the ball or bed took many frames and often overshot. The controller below
+# turns the heading error measured each frame into a motor speed (PID), so big errors turn fast, small errors turn
+# gently and gizmo slows down as it lines up. Within the deadband (the 15 degrees angle_test allows) it stops.
+
+from clock import clock
+
+
+def wrap_angle(angle):  # change angle coordinate system to be in range -180 to 180
+    return (angle + 180) % 360 - 180
+
+
+class HeadingController(object):
+    def __init__(self, kp=0.4, ki=0.0, kd=0.01, deadband=15, minSpeed=15, maxSpeed=35, maxGap=1.0):
+        self.kp = kp  # PWM per degree of error
+        self.ki = ki  # PWM per degree second
+        self.kd = kd  # PWM per degree per second
+        self.deadband = deadband  # degrees - close enough, as in angle_test
+        self.minSpeed = minSpeed  # below this PWM the motors stall on the carpet, so never ask for less
+        self.maxSpeed = maxSpeed
+        self.maxGap = maxGap  # seconds - longer between updates and the previous error is too old to use
+        self.target = None  # what gizmo is turning towards - the ball, bed and bowl each start afresh
+        self.reset()
+
+    def reset(self):  # forget the integral and previous error, e.g. when a new target is chosen
+        self.integral = 0.0
+        self.prevError = None
+        self.prevTime = None
+
+    def update(self, error, now=None, target=None):  # signed turn speed for this heading error (same sign as error)
+        now = clock.time() if now is None else now
+        error = wrap_angle(error)
+        if target != self.target:  # the last target's integral and error say nothing about this one
+            self.target = target
+            self.reset()
+        if abs(error) < self.deadband:
+            self.reset()
+            return 0
+        derivative = 0.0
+        if self.prevTime is not None and 0 < now - self.prevTime < self.maxGap:
+            dt = now - self.prevTime
+            self.integral += error * dt
+            derivative = (error - self.prevError) / dt
+        else:
+            self.integral = 0.0
+        self.prevError = error
+        self.prevTime = now
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        direction = 1 if error > 0 else -1
+        speed = min(max(output * direction, self.minSpeed), self.maxSpeed)  # a D term braking past zero still turns
+        if self.ki:  # stop the integral winding up while the motors are already flat out
+            self.integral = max(min(self.integral, self.maxSpeed / self.ki), -self.maxSpeed / self.ki)
+        return direction * speed  # towards the target, slowly, until the error is inside the deadband
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# GIZMO PIXEL - Interactive robotic pet code
+
+# instrument.py: live timing of every stage of the main loop
+
+# Stats keeps a rolling histogram of how long each named stage took (camera capture, each dot's detection, the
+# behaviour that ran, each actuator command). Recording a time is a bisect and an increment, so it can stay on all the
+# time. Histograms cover the last minute, in ten second slices that are cleared as they come round again. While gizmo
+# runs the numbers can be read from a JSON file that is rewritten every few seconds, or from a Unix socket:
+#
+#   python instrument.py /tmp/gizmo-stats.sock
+
+from __future__ import division
+
+import bisect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+timer = getattr(time, 'perf_counter', time.time)  # python 2 has no perf_counter
+
+BOUNDS = [1e-5 * 10 ** (i / 10) for i in range(61)]  # bucket upper bounds - 10 microseconds to 10 seconds, ~26% apart
+
+
+class Timing(object):  # context manager timing one block - with stats.time('capture'): ...
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.name, timer() - self.start)
+
+
+class Stats(object):
+    def __init__(self, sliceLength=10, slices=6):
+        self.sliceLength = sliceLength  # seconds per slice
+        self.slices = [{} for i in range(slices)]  # name: [bucket counts..., overflow, total seconds, max]
+        self.epochs = [None] * slices  # which slice of time each one currently holds
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def time(self, name):
+        return Timing(self, name)
+
+    def record(self, name, seconds):
+        epoch = int(time.time() // self.sliceLength)
+        index = epoch % len(self.slices)
+        with self.lock:
+            if self.epochs[index] != epoch:  # slice has come round again - drop what it held
+                self.slices[index] = {}
+                self.epochs[index] = epoch
+            histogram = self.slices[index].get(name)
+            if histogram is None:
+                histogram = self.slices[index][name] = [0] * (len(BOUNDS) + 1) + [0.0, 0.0]
+            histogram[bisect.bisect_left(BOUNDS, seconds)] += 1
+            histogram[-2] += seconds
+            if seconds > histogram[-1]:
+                histogram[-1] = seconds
+
+    def snapshot(self):  # {name: {count, rate, mean, p50, p90, p99, max}} over the rolling window, times in ms
+        now = int(time.time() // self.sliceLength)
+        merged = {}
+        with self.lock:
+            for epoch, histograms in zip(self.epochs, self.slices):
+                if epoch is None or now - epoch >= len(self.slices):
+                    continue  # too old to be in the window
+                for name, histogram in histograms.items():
+                    total = merged.setdefault(name, [0] * len(histogram))
+                    for i in range(len(histogram) - 1):
+                        total[i] += histogram[i]
+                    total[-1] = max(total[-1], histogram[-1])
+        window = self.sliceLength * len(self.slices)
+        results = {}
+        for name, histogram in merged.items():
+            counts = histogram[:-2]
+            count = sum(counts)
+            if not count:
+                continue
+            longest = histogram[-1] * 1000  # bucket bounds can overshoot the slowest time actually seen
+            results[name] = {'count': count, 'rate': count / window, 'mean': histogram[-2] / count * 1000,
+                             'p50': min(percentile(counts, count, 0.5), longest),
+                             'p90': min(percentile(counts, count, 0.9), longest),
+                             'p99': min(percentile(counts, count, 0.99), longest), 'max': longest}
+        return results
+
+    def serve(self, path):  # answer every connection to a Unix socket with the current snapshot
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(2)
+
+        def run():
+            while True:
+                connection = server.accept()[0]
+                try:
+                    connection.sendall(json.dumps(self.snapshot(), sort_keys=True).encode('utf-8'))
+                except socket.error:
+                    pass
+                connection.close()
+        self.start(run, 'stats-socket')
+
+    def dump(self, path, interval=5):  # rewrite a JSON file with the current snapshot every interval seconds
+        def run():
+            while True:
+                time.sleep(interval)
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(self.snapshot(), f, sort_keys=True)
+                os.rename(path + '.tmp', path)  # readers never see a half written file
+        self.start(run, 'stats-file')
+
+    def start(self, run, name):
+        thread = threading.Thread(target=run, name=name)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+
+def percentile(counts, count, fraction):  # upper bound (ms) of the bucket holding this fraction of the samples
+    target = fraction * count
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if seen >= target:
+            return BOUNDS[min(i, len(BOUNDS) - 1)] * 1000
+    return BOUNDS[-1] * 1000
+
+
+def show(snapshot):
+    print('%-24s %7s %7s %8s %8s %8s %8s %8s' % ('stage', 'count', 'per s', 'mean', 'p50', 'p90', 'p99', 'max'))
+    for name in sorted(snapshot):
+        s = snapshot[name]
+        print('%-24s %7d %7.1f %8.2f %8.2f %8.2f %8.2f %8.2f' % (name, s['count'], s['rate'], s['mean'], s['p50'],
+                                                                 s['p90'], s['p99'], s['max']))
+
+
+if __name__ == '__main__':  # print the stats of a running gizmo, from its socket or file
+    path = sys.argv[1] if len(sys.argv) > 1 else '/tmp/gizmo-stats.sock'
+    if path.endswith('.json'):
+        with open(path) as f:
+            show(json.load(f))
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        data = b''
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        show(json.loads(data.decode('utf-8')))
@@ -0,0 +1,63 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# leds.py: a frame buffer for the LED strip
+
+# Setting a colour used to pack it with RGB_to_color and hand it to set_pixel once per LED - 16 calls, each unpacking
+# the word again - before every show(), even when the strip already showed that colour. A Strip keeps the whole strip
+# as one bytearray of RGB bytes, the same layout the WS2801s are clocked out in. Colours are packed once and cached,
+# whole frames (any pattern, one colour per LED) can be built ahead of time with frame(), and show() compares the
+# buffer against the last frame sent and only writes to the strip when something changed, as a single transfer.
+
+import threading
+
+
+class Strip(object):
+    def __init__(self, hw, pixels):
+        self.hw = hw
+        self.pixels = pixels
+        self.size = pixels.count()
+        self.buffer = bytearray(3 * self.size)  # R, G, B for each LED
+        self.shown = None  # last frame written to the strip - None until the first write
+        self.packed = {}  # (r, g, b): 3 bytes
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.skipped = 0
+
+    def pack(self, colour):
+        word = self.packed.get(colour)
+        if word is None:
+            word = self.packed[colour] = bytes(bytearray(max(0, min(255, int(c))) for c in colour))
+        return word
+
+    def frame(self, colours):  # prepacked frame from one colour per LED (a shorter list repeats along the strip)
+        colours = list(colours)
+        return b''.join(self.pack(colours[i % len(colours)]) for i in range(self.size))
+
+    def fill(self, colour):  # every LED the same colour
+        with self.lock:
+            self.buffer[:] = self.pack(colour) * self.size
+
+    def set(self, n, colour):  # one LED
+        with self.lock:
+            self.buffer[3 * n:3 * n + 3] = self.pack(colour)
+
+    def pattern(self, colours):  # one colour per LED
+        self.load(self.frame(colours))
+
+    def load(self, frame):  # a whole frame from frame()
+        with self.lock:
+            self.buffer[:] = frame
+
+    def show(self):  # write the buffer to the strip - unless the strip is already showing it
+        with self.lock:
+            if self.buffer == self.shown:
+                self.skipped += 1
+                return False
+            self.shown = bytearray(self.buffer)
+            self.hw.show_frame(self.pixels, self.shown)
+            self.writes += 1
+            return True
+
+    def clear(self):
+        self.fill((0, 0, 0))
+        self.show()
@@ -0,0 +1,113 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# logger.py: levelled logging that never makes the main loop wait for the console
+
+# Every loop iteration used to print five or more lines, and printing to the Pi's console is slow enough to show up in
+# the frame rate. Messages now go into an in-memory ring buffer and a background thread writes them out in batches.
+# Messages logged every frame ('Idle', 'Gizmo is lost, searching...') are logged with limit=True: repeated within
+# 'interval' seconds they are counted instead of printed, and the count is added the next time one does get printed.
+# Everything else is always printed, however often it comes. Extra fields are written as key=value after the message.
+
+import collections
+import sys
+import threading
+import time
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+NAMES = dict((value, name) for name, value in LEVELS.items())
+
+
+class Logger(object):
+    def __init__(self, level=INFO, stream=None, path=None, interval=5.0, flush=0.2, size=1000):
+        self.lock = threading.Lock()
+        self.buffer = collections.deque(maxlen=size)  # (time, level, line) - oldest dropped if the writer falls behind
+        self.repeats = {}  # rate limited message: [time last printed, times suppressed since]
+        self.thread = None
+        self.file = None
+        self.path = None
+        self.configure(level, stream, path, interval, flush)
+
+    def configure(self, level=None, stream=None, path=None, interval=None, flush=None):
+        if level is not None:
+            self.level = LEVELS.get(level, level)  # 'INFO' or INFO
+        if stream is not None or not hasattr(self, 'stream'):
+            self.stream = stream or sys.stdout
+        if path is not None and path != self.path:  # each reload of main.py asks for the same file - keep it open
+            previous = self.file
+            self.file = open(path, 'a')
+            self.path = path
+            if previous is not None:
+                previous.close()
+        if interval is not None:
+            self.interval = interval  # seconds a repeated message stays quiet
+        if flush is not None:
+            self.flushInterval = flush  # seconds between writes
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='logger')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def log(self, level, message, limit=False, **fields):  # limit - only print this message every interval seconds
+        if level < self.level:
+            return
+        now = time.time()
+        suppressed = 0
+        if limit:
+            with self.lock:
+                repeat = self.repeats.get(message)
+                if repeat is not None and now - repeat[0] < self.interval:
+                    repeat[1] += 1
+                    return
+                suppressed = repeat[1] if repeat is not None else 0
+                self.repeats[message] = [now, 0]
+        line = message
+        if fields:
+            line += ' ' + ' '.join('%s=%s' % (key, fields[key]) for key in sorted(fields))
+        if suppressed:
+            line += ' (repeated %d times)' % suppressed
+        self.buffer.append((now, level, line))
+
+    def debug(self, message, limit=False, **fields):
+        self.log(DEBUG, message, limit, **fields)
+
+    def info(self, message, limit=False, **fields):
+        self.log(INFO, message, limit, **fields)
+
+    def warning(self, message, limit=False, **fields):
+        self.log(WARNING, message, limit, **fields)
+
+    def error(self, message, limit=False, **fields):
+        self.log(ERROR, message, limit, **fields)
+
+    def recent(self):  # entries not yet written out, oldest first
+        return list(self.buffer)
+
+    def format(self, entry):
+        stamp = time.strftime('%H:%M:%S', time.localtime(entry[0])) + '.%03d' % (entry[0] % 1 * 1000)
+        return '%s %-7s %s\n' % (stamp, NAMES.get(entry[1], entry[1]), entry[2])
+
+    def flush(self):  # write out everything buffered so far in one go
+        lines = []
+        while True:
+            try:
+                lines.append(self.format(self.buffer.popleft()))
+            except IndexError:  # empty - the writer thread and a final flush can race for the last entry
+                break
+        if lines:
+            text = ''.join(lines)
+            for out in (self.stream, self.file):
+                if out is not None:
+                    out.write(text)
+                    out.flush()
+
+    def run(self):
+        while True:
+            time.sleep(self.flushInterval)
+            try:
+                self.flush()
+            except (IOError, ValueError):  # console gone or file closed - keep buffering rather than crash
+                pass
+
+
+log = Logger()  # shared by every module - main.py sets the level and log file
@@ -12,18 +12,102 @@ from __future__ import division  # change the / operator to mean true division
 
 print('GIZMO PIXEL - COPYRIGHT BEN COBLEY AND JOE SHEPHERD NOVEMBER 2017')
 
+from startup import Startup
+startup = Startup()  # times each phase until the first frame - the slow libraries are only imported when first used
+
 print('Importing utils...')  # import from utils file
 from utils import *
+print('Importing vision...')  # import single pass dot detector
+from vision import Detector, NumpyBackend
+from targets import TARGETS, blue
+print('Importing camera...')  # import background frame capture
+from camera import Capture
+print('Importing scheduler...')  # import background actuator commands
+from scheduler import Scheduler
+print('Importing clock...')  # import real time, or virtual time in simulate.py
+from clock import clock
+print('Importing heading control...')  # import closed loop turning
+from heading import HeadingController, wrap_angle
+print('Importing instrumentation...')  # import live stage timings
+from instrument import Stats, timer
+print('Importing logger...')  # import buffered logging
+from logger import log
+print('Importing face...')  # import persistent face animation players
+from face import Face
+print('Importing LED frame buffer...')  # import LED strip buffer
+from leds import Strip
+print('Importing LED effects...')  # import background LED animations
+from effects import Effects, cycle
+print('Importing servo control...')  # import smooth servo motions
+from servo import Motion, Servo
+print('Importing behaviours...')  # import behaviour rules
+from behaviour import Engine, RULES, State
+print('Importing resident handles...')  # import hardware kept open by daemon.py
+import resident
 
 # SETTINGS
 
-showDisplay = False  # turn OpenCV display on/off
+showDisplay = False  # turn tracking overlay on/off - drawn on a background thread, see overlayPort and overlaySnapshot
+overlayRate = 5  # overlay frames per second, at most - frames in between are not drawn
+overlayPort = 8080  # watch the overlay at http://<pi>:8080/ - None for no stream
+overlaySnapshot = None  # e.g. '/tmp/gizmo.jpg' - rewritten every few seconds with the latest overlay frame
 showAnimation = True  # turn Gizmo face animation display on on/off
+frameSize = (640, 480)  # camera resolution (width, height) - e.g. (1280, 720) for HD, with pyramidStep 2
+maxFrameAge = 0.5  # seconds - older camera frames are stale and are not acted on
+fidgetInterval = 5  # seconds from the start of one idle wiggle to the next - each wiggle takes 1.5 seconds
+numpyVision = True  # segment images with numpy buffers instead of SimpleCV image operations (check with mask_agreement)
+trackDots = True  # only search a window around where each dot was last seen
+logLevel = 'INFO'  # DEBUG also shows every servo move
+logFile = None  # e.g. '/home/pi/gizmo.txt' - keep a copy of the log
+statsFile = '/tmp/gizmo-stats.json'  # live stage timings - read with: python instrument.py /tmp/gizmo-stats.sock
+statsSocket = '/tmp/gizmo-stats.sock'
+recordLog = None  # e.g. '/home/pi/gizmo.log' - record frames and the dots found in them, for replaying later
+recordEvery = 3  # record one frame in every 3 - raw 640x480 frames at 15 fps would be 14 MB a second
+recordLimit = 500  # MB - then the log is moved to recordLog + '.1' and a new one started, so at most twice this is kept
+pyramidStep = 1  # search whole frames at 1/pyramidStep resolution, confirm dots at full resolution (2 for HD)
+visionWorkers = 0  # e.g. 3 on the quad-core Pi - capture and find dots in separate processes (numpy vision only)
+robotCount = 1  # gizmos sharing the overhead camera - more than one pairs up every large and small dot into poses
+robotId = 0  # which of them this gizmo is - gizmo n is the one that starts nearest robotHomes[n]
+robotHomes = None  # e.g. [(120, 160), (120, 320)] - where each gizmo starts, so every run agrees which is which
+posePort = 5005  # with several gizmos, the one with the camera broadcasts every pose on this UDP port
+poseSource = False  # True on gizmos without a camera - they take their poses and the dots from the broadcast
+globals().update(resident.keep('settings', dict))  # settings changed by simulate.py - none when run normally
 
 # INITIALISATION
 
-print('Initialising camera...')
-cam = SimpleCV.Camera()
+startup.mark('imports')
+log.configure(level=logLevel, path=logFile)  # messages are written out by a background thread
+
+
+def open_stats():  # rolling histograms of how long each stage takes
+    stats = Stats()
+    if statsFile:
+        stats.dump(statsFile)
+    if statsSocket:
+        stats.serve(statsSocket)
+    return stats
+
+
+def open_pwm(pin, duty):  # start a pwm pin at 50Hz
+    pwm = GPIO.PWM(pin, 50)  # set pwm pin and frequency
+    pwm.start(duty)  # initialise pin
+    return pwm
+
+
+stats = resident.keep('stats', open_stats)  # handles are kept open between runs by daemon.py
+
+camera = None
+if not visionWorkers and not poseSource:  # otherwise the pipeline's capture process opens the camera
+    print('Initialising camera...')  # webcam, or recorded/synthetic frames in simulation - opened in the background
+    camera = startup.start('camera', resident.keep, 'capture', lambda: Capture(hw.camera(frameSize)).start(),
+                           lambda capture: capture.stop())  # grab and flip images on a background thread
+
+print('Initialising LEDS...')  # LED driver loads in the background while the pins are set up
+PIXEL_COUNT = 16  # number of leds
+PIXEL_CLOCK = 21  # LED clock pin number
+PIXEL_DOUT = 10  # LED DOUT pin number
+leds = startup.start('leds', resident.keep, 'strip',  # only writes to the LEDs when the colours change
+                     lambda: Strip(hw, hw.pixels(PIXEL_COUNT, clk=PIXEL_CLOCK, do=PIXEL_DOUT)))
 
 print('Initialising motors...')
 GPIO.setmode(GPIO.BCM)  # use broadcom pin numbers
@@ -34,146 +118,128 @@ GPIO.setup(12, GPIO.OUT)  # right PWM
 GPIO.setup(22, GPIO.OUT)  # left forward
 GPIO.setup(23, GPIO.OUT)  # left backward
 GPIO.setup(13, GPIO.OUT)  # left PWM
-l = GPIO.PWM(12, 50)  # set pwm pin and frequency
-r = GPIO.PWM(13, 50)  # set pwm pin and frequency
-l.start(0)   # initialise pin
-r.start(0)   # initialise pin
+l = resident.keep('left', lambda: open_pwm(12, 0), lambda pwm: pwm.stop())
+r = resident.keep('right', lambda: open_pwm(13, 0), lambda pwm: pwm.stop())
 
 normalSpeed = 20  # speed of normal driving motion
+turnTolerance = 15  # degrees - gizmo is facing a target when within this angle of it
+turnTimeout = 0.3  # seconds - stop turning if no new frame arrives to correct the turn
+heading = HeadingController(kp=0.4, ki=0.0, kd=0.01, deadband=turnTolerance, minSpeed=15, maxSpeed=35)
 
 print('Initialising servo...')
 GPIO.setup(18, GPIO.OUT)  # Front leg
-s = GPIO.PWM(18, 50)  # set pwm pin and frequency
-s.start(11)   # initialise pin
+s = resident.keep('servo', lambda: open_pwm(18, 11))
 
 upDuty = 11  # set duty cycle of up position
 downDuty = 9.5  # set duty cycle of down position
+servo = None  # the servo, scheduler and LED threads only start once everything else has opened, just before the loop
+scheduler = None
+effects = None
+startup.mark('motors and servo')
 
-print('Initialising LEDS...')
-PIXEL_COUNT = 16  # number of leds
-PIXEL_CLOCK = 21  # LED clock pin number
-PIXEL_DOUT = 10  # LED DOUT pin number
-pixels = Adafruit_WS2801.WS2801Pixels(PIXEL_COUNT, clk=PIXEL_CLOCK, do=PIXEL_DOUT)
+print('Initialising LED effects...')
+strip = leds.result()  # only waits if the LED driver is still loading
+discoColours = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+disco = cycle(discoColours, hold=0.5)  # flash through the disco colours until stopped
 
+face = None
+if showAnimation is True:
+    print('Initialising face...')  # the common faces are loaded in the background, ready to switch to
+    face = resident.keep('face', lambda: Face(hw, prewarm=['/home/pi/Idle.mp4', '/home/pi/Happy.mp4',
+                                                           '/home/pi/Tired.mp4']), lambda face: face.quit())
+startup.mark('LEDs and face')
 
+
+gizmo = resident.keep('gizmo', State)  # needs, and what was seen this frame - simulate.py watches them
 print('Resurrecting...')
-dead = False  # bringing gizmo back to life
+gizmo.dead = False  # bringing gizmo back to life
 print('Feeding...')
-hunger = 0  # eating children
+gizmo.hunger = 0  # eating children
 print('Resting...')
-tiredness = 0  # counting sheep
+gizmo.tiredness = 0  # counting sheep
 print('Entertaining...')
-boredom = 0  # watching netflix
+gizmo.boredom = 0  # watching netflix
 
 # VARIABLES
 
 print('Setting variables...')
-count = 0
 lostCount = 0
-prevCount, prevColour, prevCoords,  = None, None, None
+prevCoords = None
 botCoords = None
 lost = False
-
-green = (0, 255, 0)  # RGB colour values for detection
-gThresh = 170  # binarizing threshold (see below). Values found by calibration testing
-blue = (0, 0, 255)
-bThresh = 150
-orange = (255, 0, 0)
-oThresh = 160
-red = (255, 0, 0)
-rThresh = 150
-
-sBotMin = 1600  # dot areas (in number of pixels) for detection - based on size and distance from camera
-sBotMax = 2800
-lBotMin = 4000
-lBotMax = 7000
-xsFloorMin = 450
-xsFloorMax = 800
-ballMin = 3500
-ballMax = 5500
+frame = None
+lastFidget = None  # when gizmo last wiggled
+fidgets = 0
+
+targets = TARGETS  # every dot Gizmo tracks, with their thresholds and areas - see targets.py
+if numpyVision is True:
+    detector = Detector(targets, NumpyBackend(), track=trackDots, pyramid=pyramidStep, stats=stats)
+else:
+    detector = Detector(targets, track=trackDots, pyramid=pyramidStep, stats=stats)
+robots = None
+publisher = None
+pipeline = None
+if robotCount > 1 or poseSource:
+    print('Importing robot tracking...')  # import poses of several gizmos under one camera
+    from robots import Publisher, Robots, Subscriber
+if poseSource:  # every pose and dot comes from the gizmo with the camera - no vision here at all
+    print('Initialising pose subscriber...')
+    pipeline = resident.keep('poses', lambda: Subscriber(posePort).start(), lambda poses: poses.stop())
+elif robotCount > 1:  # this gizmo has the camera - it finds every gizmo's pose and tells the others
+    robots = Robots(count=robotCount, homes=robotHomes)  # keeps each gizmo's id from frame to frame
+    publisher = resident.keep('publisher', lambda: Publisher(posePort), lambda publisher: publisher.close())
+if visionWorkers and not poseSource:
+    print('Importing vision pipeline...')  # import multi-process capture and detection
+    from pipeline import Pipeline
+    print('Initialising vision pipeline...')
+    pipeline = resident.keep('pipeline', lambda: Pipeline(hw, targets, workers=visionWorkers, size=frameSize,
+                             track=trackDots, pyramid=pyramidStep, every=['sBlue', 'lBlue'] if robots else (),
+                             stats=stats).start(), lambda pipeline: pipeline.stop())
+overlay = None
+if showDisplay is True and not poseSource:  # nothing to show without a camera
+    print('Importing overlay...')  # import background tracking display
+    from overlay import Overlay
+    overlay = resident.keep('overlay', lambda: Overlay(overlayRate, overlayPort, overlaySnapshot),
+                            lambda overlay: overlay.stop())
+    colours = dict((target.name, target.colour) for target in targets)
+recorder = None
+if recordLog and not poseSource:
+    print('Importing recorder...')  # import frame and detection recording
+    from recorder import Recorder
+    recorder = Recorder(recordLog, [target.name for target in targets], every=recordEvery,
+                        limit=recordLimit * 1024 * 1024)
+startup.mark('vision')
 
 ## MAIN
 
-# OPTICAL TRACKING
-
-# SimpleCV is a simplified, accessible version of OpenCV, where much of OpenCV's customisable functionality is condensed
-# into logical simple Python functions. However this unfortunately does not mean to say that is is easy to work with!
-# This code was adapted from examples on the SimpleCV github and from Practical Computer Vision with SimpleCV:
-# K Demaagd et al. ISBN: 9781449320362.
-
-# These examples showed how to identify and track individual circles, but could not differentiate between multiple circles.
-# Multiple object tracking, colour, and size differentiation was entirely my own work - Ben Cobley.
-
-def update_coords(colour, threshold, minArea, maxArea, count):
-    global prevCount
-    global prevColour
-    global circles
-
-    if colour != prevColour or count != prevCount:  # to decrease optical tracking update times, don't repeat for scan for tracking of same colour (unless new image)
-        cdimg = img.colorDistance(colour).dilate(2)  # stretch colours so that chosen colour is darker
-        binimg = cdimg.binarize(threshold, 255)  # binarise to separate colours darker than threshold from lighter than threshold
-        blobs, circles, dots = None, None, None  # reset circles found to None
-        blobs = binimg.findBlobs()  # find 'blobs' in image - areas of consistent colour
-        if blobs:
-            circles = blobs.filter([blob.isCircle(0.25) for blob in blobs])  # filter to find circles in blobs - below theshold - experimented to find 0.25 as optimum
-    prevColour = colour  # update current colour
-    prevCount = count  # update current count
-    if circles:
-        dots = circles.filter([minArea < circle.area() < maxArea for circle in circles])  # filter for circles of correct area - define as dots
-        if dots:
-            coords = (dots[-1].x, dots[-1].y)  # output dot coordinates
-            return coords
-        else:
-            return None
-    else:
-        return None
-
+# MOTION
 
 def move_forward(target, speed):
     global botCoords
     motionVector = tuple(numpy.subtract(target, botCoords))  # use bot coords to find vector to target
     moveTime = math.sqrt(motionVector[0] ** 2 + motionVector[1] ** 2) / 150  # time calculated by distance to target - found by experimentation
-    drive(speed)  # call drive function
-    time.sleep(moveTime) # wait
-    motors_off()  # turn motors off
+    scheduler.queue('motors', [(lambda: drive(speed), moveTime)], stop=motors_off)  # drive, then turn motors off
     return moveTime  # output time so that gizmo can reverse same distance
 
 
 def move_backward(moveTime):
-    drive(-normalSpeed)   # call drive function
-    time.sleep(moveTime)  # wait
-    motors_off()  # turn motors off
+    scheduler.queue('motors', [(lambda: drive(-normalSpeed), moveTime)], stop=motors_off)  # reverse, then motors off
 
 
-def move_angle(target):
+def turn_angle(target):  # angle gizmo has to turn to face target
     global botCoords
-    if angle_test(target) is False:  # test to see whether angle is already correct
-        motionVector = tuple(numpy.subtract(target, botCoords))  # calculate vector to target
-        motionAngle = - round(math.degrees(math.atan2(motionVector[1], motionVector[0])))  # calculate angle to target
-        turnAngle = -(botAngle + motionAngle)  # angle required to turn
-        if turnAngle < -180:
-            turnAngle = turnAngle + 360  # change angle coordinate system to be in range -180 to 180
-        if turnAngle > 25:  # turn speed based on turn angle
-            right(-normalSpeed)
-            left(normalSpeed)
-            time.sleep(0.3)  # keep motors on for 0.3 seconds or until next optical tracking update
-            motors_off()
-        elif 25 >= turnAngle > 15:
-            right(-normalSpeed)
-            left(normalSpeed)
-            time.sleep(0.05)
-            motors_off()
-
-        elif turnAngle  < -25:
-            right(normalSpeed)
-            left(-normalSpeed)
-            time.sleep(0.3)
-            motors_off()
-        elif -25 <= turnAngle < -15:
-            right(normalSpeed)
-            left(-normalSpeed)
-            time.sleep(0.05)
-            motors_off()
+    motionVector = tuple(numpy.subtract(target, botCoords))  # calculate vector to target
+    motionAngle = - round(math.degrees(math.atan2(motionVector[1], motionVector[0])))  # calculate angle to target
+    return wrap_angle(-(botAngle + motionAngle))  # angle required to turn, in range -180 to 180
+
+
+def move_angle(target, name):
+    turnSpeed = heading.update(turn_angle(target), target=name)  # PWM from heading error - 0 once within turnTolerance
+    if turnSpeed == 0:
+        scheduler.cancel('motors')  # stopping the turn turns the motors off
+    else:  # keep turning until the next frame corrects it - each new frame replaces the previous turn
+        scheduler.run('motors', [(lambda: spin(-turnSpeed), turnTimeout)], stop=motors_off, name='turn',
+                      interruptible=True)
 
 
 def drive(value):
@@ -181,6 +247,11 @@ def drive(value):
     left(value)
 
 
+def spin(value):  # turn on the spot - positive value turns right wheel forward and left wheel backward
+    right(value)
+    left(-value)
+
+
 def right(value):  # define functions 'right' and 'left' to make calling motors easier. 'Value' gives motor PWM and direction
     global rightMotor
     rightMotor = abs(value)  # uses absolute value to define PWM 
@@ -212,45 +283,43 @@ def motors_off():
     GPIO.output(23, False)
 
 
+def wiggle(value):  # idle motion - turn one way, pause, turn back
+    scheduler.queue('motors', [(lambda: spin(value), 0.5), (motors_off, 0.5), (lambda: spin(-value), 0.5)],
+                    stop=motors_off)
+
+
 def look_up():  # move servo to 'up' position 
-    print('up')
-    for repeats in range(1, 3):  # repeated 3 times because does not reach desired angle in 1 attempt - too much load
-        s.ChangeDutyCycle(upDuty)
-        time.sleep(0.1)
+    log.debug('up')
+    servo.move(upDuty, 0.2)  # eased rather than jumped - does nothing if already up
 
 
 def look_down():  # move servo to 'down' position 
-    print('down')
-    for repeats in range(1, 3):  # repeated 3 times because does not reach desired angle in 1 attempt - too much load
-        s.ChangeDutyCycle(downDuty)
-        time.sleep(0.1)
+    log.debug('down')
+    servo.move(downDuty, 0.2)
 
 
-def servo_sleep(length):  # up and down 'breathing' motion while gizmo is asleep 
-    print('sleep')
-    look_up()
-    duty = upDuty  # set initial position
-    count = 0
-    while count < length:  # run for length of sleep face animation
-        print('in')
-        while duty > downDuty:
-            duty -= ((upDuty - downDuty) / 10)  # move from up to down in 10 1 tenth motions
-            s.ChangeDutyCycle(duty)
-            time.sleep(0.1)
-        print('out')
-        while duty < upDuty:
-            duty += ((upDuty - downDuty) / 10)  # move from down to up in 10 1 tenth motions
-            s.ChangeDutyCycle(duty)
-            time.sleep(0.1)
-        count += 1
-
-
-def blink_color(pixels, blink_times, color):  # adapted from the Adafruit WS2801 Python GitHub
-    for i in range(blink_times):  # number of blinks
-        for j in range(pixels.count()):  # number of LEDs
-            pixels.set_pixel(j, Adafruit_WS2801.RGB_to_color( color[0], color[1], color[2] ))
-        pixels.show()
-        time.sleep(0.5)  # blink length
+def servo_sleep(length, delay=0):  # up and down 'breathing' motion while gizmo is asleep, after delay seconds
+    log.debug('sleep')
+    breathing = Motion([(downDuty, 1, 'inout'), (upDuty, 1, 'inout')], repeat=length, delay=delay)  # out, then in
+    return servo.play(breathing)  # output time so that gizmo can stay in bed until it finishes
+
+
+def blink_color(strip, blink_times, color):  # adapted from the Adafruit WS2801 Python GitHub
+    effects.play(cycle([color] * blink_times, hold=0.5, loop=False))  # 0.5 second blink length
+
+
+def dance():  # wiggle left and right to the music, flashing the LEDs
+    steps = [(lambda: (effects.play(disco), spin(-25)), 0.25)]  # lights flash on their own thread meanwhile
+    for repeats in range(0, 6):  # move left and right
+        for i in range(len(discoColours)):
+            steps.append((lambda value=(25 if i % 2 == 0 else -25): spin(value), 0.5))
+        steps.append((motors_off, 0))
+    steps.append((lambda: spin(25), 0.25))
+    steps.append((lambda: drive(-normalSpeed), 1.5))  # reverse back to back of box
+    steps.append((motors_off, 0))
+    steps.append((effects.stop, 0))  # lights off
+    steps.append((lambda: change_video('/home/pi/Happy.mp4'), 0))
+    scheduler.queue('motors', steps, stop=lambda: (motors_off(), effects.stop()))  # lights off if interrupted too
 
 
 def stationary_test(coords):  # used to test whether object is stationary from one frame to the next  //
@@ -263,13 +332,7 @@ def stationary_test(coords):  # used to test whether object is stationary from o
 
 
 def angle_test(target):  # test whether gizmo is facing the correct direction before an action is performed
-    global botCoords
-    motionVector = tuple(numpy.subtract(target, botCoords))  # calculate vector to target
-    motionAngle = - round(math.degrees(math.atan2(motionVector[1], motionVector[0])))  # calculate angle to target
-    turnAngle = -(botAngle + motionAngle)  # angle required to turn
-    if turnAngle < - 180:
-        turnAngle = turnAngle + 360  # change angle coordinate system to be in range -180 to 180
-    if abs(turnAngle) < 15:  # within 15 degrees angle test is true
+    if abs(turn_angle(target)) < turnTolerance:  # within 15 degrees angle test is true
         return True
     else:
         return False
@@ -277,299 +340,256 @@ def angle_test(target):  # test whether gizmo is facing the correct direction be
 
 def change_video(path):  # change current face animation video to new one
     if showAnimation is True:  # only if show animation is on
-        global player
-        try:  # quit current video first - changeover is faster
-            player.quit()
-        except:  # error handling required because video player runs very poorly, often breaks
-            print('No video playing to quit - Change.')
-        video_path = Path(path)  # use video path from function call
-        player = OMXPlayer(video_path)  # define player
-        player.set_video_pos(1, 1, 719, 479)  # define video coords, 1 pixel in from edges of screen
-        player.play()  # play video
+        face.change(path)  # switches players - nothing is started or quit unless the clip isn't loaded yet
 
 
 def try_video(path):  # change video ONLY IF previous video has finished
-    global player
     if showAnimation is True:  # only if show animation is on
-        try:  # quit current video first - changeover is faster
-            player.is_playing()
-        except:  # error handling required because function returns true or just breaks - this was an absolute ***** to troubleshoot
-            try:
-                player.quit()
-            except:  # error handling required because video player runs very poorly, often breaks
-                print('No video playing to quit - Try.')
-            print('Resetting video')
-            video_path = Path(path)  # use video path from function call
-            player = OMXPlayer(video_path)  # define player
-            player.set_video_pos(1, 1, 719, 479)  # define video coords, 1 pixel in from edges of screen
-            player.play()  # play video
+        face.try_change(path)
 
 
 def stop_video():  # stop video
-    global player
     if showAnimation is True:
-        try:
-            player.is_playing()
-        except:  # error handling required because video player runs very poorly, often breaks
-            try:
-                player.quit()
-            except:
-                print('No video playing to quit - Try.') #try
-
-
-blink_color(pixels, blink_times=1, color=(0, 0, 0))  # turn leds off - on at start as standard
-
-while True:  # while true loop to run infinitely
-    try:  # except keyboard interrupt, to help quit without failiures
-        print('______')
-        print(count)
-        print('Hunger: ', hunger)  # keep track of gizmo's needs in terminal
-        print('Tiredness: ', tiredness)
-        print('Boredom: ', boredom)
-        img = cam.getImage().flipHorizontal()  # get image from webcam
-        sBlue, lBlue, lGreen, xsRed, xsBlue, ball = None, None, None, None, None, None  # reset tracked dots to none
-
-        # UPDATE COORDS
-        # update coords of all dots based on their colour, colour threshold and size thresholds
-        sBlue = update_coords(blue, bThresh, sBotMin, sBotMax, count)
-        lBlue = update_coords(blue, bThresh, lBotMin, lBotMax, count)
-        xsBlue = update_coords(blue, bThresh, xsFloorMin, xsFloorMax, count)
-        lGreen = update_coords(green, gThresh, xsFloorMin, xsFloorMax, count)
-        xsRed = update_coords(red, rThresh, xsFloorMin, xsFloorMax, count)
-        ball = update_coords(orange, oThresh, ballMin, ballMax, count)
-
-        # MOTORS
-
-        if lBlue and sBlue:  # perform all below operations ONLY if lBlue and sBlue are found - if Gizmo is tracking correctly
-            botCoords = lBlue  # bot coords defined by large blue dot on forehead
-            botVector = (lBlue[0] - sBlue[0], lBlue[1] - sBlue[1])  # calculate vector of gizmo
-            botAngle = round(math.degrees(math.atan2(botVector[1], botVector[0])))  # calculate angle to horizontal
-
-            # in elif loop so that only one of the following functions is performed for each camera refresh
-
-            if dead and lGreen and xsBlue and xsRed:  # resurrect if all 3 dots are placed in the camera view
-                tiredness = 0
-                boredom = 0
-                hunger = 0
-                dead = False
-                change_video('/home/pi/Happy.mp4')
-                look_up()
-                print('Resurrecting...')
-            elif tiredness > 1000 and hunger > 1000 and boredom > 1000:  # die if gizmo's needs get too high
-                look_down()
-                print('DEAD - you did not look after me properly!')
-                if dead is False:
-                    change_video('/home/pi/Dead.mp4')
-                dead = True
-
-            elif xsBlue and tiredness < 500 and boredom > 5:  # dance if boombox is placed in camera view
-                print('Boombox found')
-                stationary = stationary_test(xsBlue)  # only once boombox is stationary
-                if stationary:
-                    print('Boombox stationary')
-                    change_video('/home/pi/Disco.mp4')
-                    right(-25)
-                    left(25)
-                    time.sleep(0.25)
-                    for repeats in range(0, 6):  # move left and right and flash led lights
-                        right(25)
-                        left(-25)
-                        blink_color(pixels, blink_times=1, color=(255, 0, 0))  # use time.sleep in blink function for timing
-                        right(-25)
-                        left(+25)
-                        blink_color(pixels, blink_times=1, color=(0, 255, 0))
-                        right(25)
-                        left(-25)
-                        blink_color(pixels, blink_times=1, color=(0, 0, 255))
-                        right(-25)
-                        left(+25)
-                        blink_color(pixels, blink_times=1, color=(255, 255, 0))
-                        right(25)
-                        left(-25)
-                        blink_color(pixels, blink_times=1, color=(255, 0, 255))
-                        right(-25)
-                        left(+25)
-                        blink_color(pixels, blink_times=1, color=(0, 255, 255))
-                        motors_off()
-                    right(25)
-                    left(-25)
-                    time.sleep(0.25)
-                    drive(-normalSpeed)  # reverse back to back of box
-                    time.sleep(1.5)
-                    motors_off()
-                    blink_color(pixels, blink_times=1, color=(0, 0, 0))
-                    change_video('/home/pi/Happy.mp4')
-                    tiredness += 200
-                    hunger += 200
-                    boredom = 0
-
-            elif ball and boredom > 5:  # 'kick' ball if ping pong ball is placed in camera view and bored enough
-                if stationary_test(ball):  # only once ball is stationary
-                    if angle_test(ball):  # if gizmo is facing ball
-                        change_video('/home/pi/Activated.mp4')
-                        time.sleep(0.5)
-                        print('FIRE')
-                        drive(100)  # drive at full speed
-                        time.sleep(0.5)
-                        motors_off()
-                        time.sleep(1)
-                        tiredness += 200
-                        hunger += 200
-                        boredom = 0
-                        move_backward(1)
-                    else:
-                        move_angle(ball)
-
-            elif lGreen and tiredness > 5:  # sleep if bed is placed in camera view and tired enough
-                if stationary_test(lGreen):
-                    if angle_test(lGreen):
-                        print('Going to bed')
-                        change_video('/home/pi/Sleep.mp4')
-                        moveTime = move_forward(lGreen, normalSpeed)
-                        servo_sleep(4)
-                        tiredness = 0
-                        hunger += 200
-                        boredom += 200
-                        move_backward(moveTime)
-                    else:
-                        move_angle(lGreen)
-
-            elif xsRed and hunger > 2:  # eat if food bowl is placed in camera view and hungry enough
-                if stationary_test(xsRed):
-                    if angle_test(xsRed):
-                        print('Going to eat')
-                        change_video('/home/pi/Eating.mp4')
-                        moveTime = move_forward(xsRed, normalSpeed)
-                        time.sleep(27)  # change to length of vid
-                        hunger = 0
-                        try_video('/home/pi/Happy.mp4')
-                        look_up()
-                        move_backward(moveTime)
-                    else:
-                        move_angle(xsRed)
-
-            elif tiredness > 500:  # if tiredness gets too high: display tired face and run idle motion
-                print('Tired')
-                look_down()
-                try_video('/home/pi/Tired.mp4')
-                if count % 15 is True:
-                    right(20)
-                    left(-20)
-                    time.sleep(0.5)
-                    motors_off()
-                    time.sleep(0.5)
-                    right(-20)
-                    left(20)
-                    time.sleep(0.5)
-                    motors_off()
-                elif count % 16 is True:
-                    right(-20)
-                    left(20)
-                    time.sleep(0.5)
-                    motors_off()
-                    time.sleep(0.5)
-                    right(20)
-                    left(-20)
-                    time.sleep(0.5)
-                    motors_off()
-
-            elif hunger > 700:  # if hunger gets too high: display angry face and run idle motion
-                print('Hungry')
-                look_up()
-                try_video('/home/pi/Angry.mp4')
-                if count % 15 is True:  # run only once every 15 refreshes
-                    right(20)
-                    left(-20)
-                    time.sleep(0.5)
-                    motors_off()
-                    time.sleep(0.5)
-                    right(-20)
-                    left(20)
-                    time.sleep(0.5)
-                    motors_off()
-
-            elif boredom > 250:  # if boredom gets too high: display sad face and run idle motion
-                print('Bored')
-                look_up()
-                try_video('/home/pi/Sad.mp4')
-                if count % 15 is True:  # run only once every 15 refreshes
-                    right(20)
-                    left(-20)
-                    time.sleep(0.5)
-                    motors_off()
-                    time.sleep(0.5)
-                    right(-20)
-                    left(20)
-                    time.sleep(0.5)
-                    motors_off()
-
-            # IDLE
-
-            else:  # if no other actions occur - call idle motion
-                print('Idle')
-                try_video('/home/pi/Idle.mp4')
-                look_up()
-                if count % 15 is True:  # run only once every 15 refreshes
-                    right(20)
-                    left(-20)
-                    time.sleep(0.5)
-                    motors_off()
-                    time.sleep(0.5)
-                    right(-20)
-                    left(20)
-                    time.sleep(0.5)
-                    motors_off()
-
-
-        elif botCoords is None:  # print until bot is found for first time
-            print('Finding bot for first time...')
-        else:  # run lost protocol
-            try_video('/home/pi/Lost.mp4')
-            motors_off()
-            print('Gizmo is lost, searching... ')
-
-        # DISPLAY
-
-        if showDisplay is True:  # if show display is on, show SimpleCV object tracking on screen to aid troubleshooting
-            if xsBlue:
-                img.drawCircle(xsBlue, 10, blue, 5)
-            if sBlue:
-                img.drawCircle(sBlue, 10, blue, 5)
-            if lBlue:
-                img.drawCircle(lBlue, 10, blue, 5)
-            if xsRed:
-                img.drawCircle(xsRed, 10, red, 5)
-            if lGreen:
-                img.drawCircle(lGreen, 10, green, 5)
-            if ball:
-                img.drawCircle(ball, 10, orange, 5)
-            img.show()
-
-        hunger = hunger + random.randint(0, 4)  # randomly increase Gizmo's needs as time goes on
-        boredom = boredom + random.randint(0, 4)
-        tiredness = tiredness + random.randint(0, 4)
-        count = count + 1
-
-    except KeyboardInterrupt:  # keyboard interrupt handling to prevent errors/crashing upon quit
-        print(' Quitting... ')
-        GPIO.output(25, False)  # turn motors off or they will continue running forever
-        GPIO.output(17, False)
-        GPIO.output(22, False)
-        GPIO.output(23, False)
-        l.stop()
-        r.stop()
-        GPIO.cleanup()
-        try:  # wait till video finishes to prevent fatal OMXPlayer crashes
-            if player.is_playing():
-                print('Waiting for video to stop...')
-        except:
-            try:
-                player.quit()
-            except:
-                print('This video player runs like pure ****')  # yes, this was very frustrating
-        print('Thank you for interacting with Gizmo')  # thank you for reading all the way to the bottom of my code
-        quit()
+        if not face.playing():
+            face.stop()
+
+
+# BEHAVIOURS
+# one action per rule in behaviour.RULES - the engine runs the highest priority rule whose guard is true
 
+def fidget(gizmo, value=20, alternate=False):  # idle motion, only once every fidgetInterval seconds
+    global lastFidget, fidgets
+    now = clock.time()
+    if lastFidget is None or now - lastFidget >= fidgetInterval:
+        lastFidget = now
+        fidgets += 1
+        wiggle(-value if alternate and fidgets % 2 == 0 else value)  # alternate directions from one wiggle to the next
+
+
+def find_bot(gizmo):  # print until bot is found for first time
+    log.info('Finding bot for first time...', limit=True)
+
+
+def lost_protocol(gizmo):  # run lost protocol
+    try_video('/home/pi/Lost.mp4')
+    if not gizmo.busy:  # a blink of lost tracking shouldn't abandon an action half way
+        motors_off()
+    log.info('Gizmo is lost, searching... ', limit=True)
+
+
+def resurrect(gizmo):  # resurrect if all 3 dots are placed in the camera view
+    scheduler.cancel()  # resurrection and death interrupt anything gizmo is in the middle of
+    gizmo.tiredness = 0
+    gizmo.boredom = 0
+    gizmo.hunger = 0
+    gizmo.dead = False
+    change_video('/home/pi/Happy.mp4')
+    look_up()
+    log.info('Resurrecting...')
+
+
+def die(gizmo):  # die if gizmo's needs get too high
+    if gizmo.dead is False:
+        scheduler.cancel()
+    look_down()
+    log.info('DEAD - you did not look after me properly!', limit=True)
+    if gizmo.dead is False:
+        change_video('/home/pi/Dead.mp4')
+    gizmo.dead = True
+
+
+def busy(gizmo):  # let the current action finish - tracking carries on meanwhile
+    log.info('Busy', limit=True)
+
+
+def boombox(gizmo):  # dance if boombox is placed in camera view
+    log.info('Boombox found', limit=True)
+    stationary = stationary_test(gizmo.found['xsBlue'])  # only once boombox is stationary
+    if stationary:
+        log.info('Boombox stationary')
+        change_video('/home/pi/Disco.mp4')
+        dance()  # runs in the background, ending with the happy face
+        gizmo.tiredness += 200
+        gizmo.hunger += 200
+        gizmo.boredom = 0
+
+
+def kick(gizmo):  # 'kick' ball if ping pong ball is placed in camera view and bored enough
+    ball = gizmo.found['ball']
+    if stationary_test(ball):  # only once ball is stationary
+        if angle_test(ball):  # if gizmo is facing ball
+            change_video('/home/pi/Activated.mp4')
+            log.info('FIRE')
+            scheduler.queue('motors', [(None, 0.5), (lambda: drive(100), 0.5), (motors_off, 1)],
+                            stop=motors_off)  # wait, drive at full speed, stop
+            gizmo.tiredness += 200
+            gizmo.hunger += 200
+            gizmo.boredom = 0
+            move_backward(1)
+        else:
+            move_angle(ball, 'ball')
+
+
+def sleep(gizmo):  # sleep if bed is placed in camera view and tired enough
+    lGreen = gizmo.found['lGreen']
+    if stationary_test(lGreen):
+        if angle_test(lGreen):
+            log.info('Going to bed')
+            change_video('/home/pi/Sleep.mp4')
+            moveTime = move_forward(lGreen, normalSpeed)
+            sleepTime = servo_sleep(4, delay=moveTime)  # breathe once in bed
+            scheduler.queue('motors', [(None, sleepTime - moveTime)])  # stay in bed until done
+            gizmo.tiredness = 0
+            gizmo.hunger += 200
+            gizmo.boredom += 200
+            move_backward(moveTime)
+        else:
+            move_angle(lGreen, 'lGreen')
+
+
+def eat(gizmo):  # eat if food bowl is placed in camera view and hungry enough
+    xsRed = gizmo.found['xsRed']
+    if stationary_test(xsRed):
+        if angle_test(xsRed):
+            log.info('Going to eat')
+            change_video('/home/pi/Eating.mp4')
+            moveTime = move_forward(xsRed, normalSpeed)
+            gizmo.hunger = 0
+            scheduler.queue('motors', [(None, 27),  # change to length of vid
+                                       (lambda: try_video('/home/pi/Happy.mp4'), 0), (look_up, 0)])
+            move_backward(moveTime)
+        else:
+            move_angle(xsRed, 'xsRed')
+
+
+def tired(gizmo):  # if tiredness gets too high: display tired face and run idle motion
+    log.info('Tired', limit=True)
+    look_down()
+    try_video('/home/pi/Tired.mp4')
+    fidget(gizmo, 20, alternate=True)
+
+
+def hungry(gizmo):  # if hunger gets too high: display angry face and run idle motion
+    log.info('Hungry', limit=True)
+    look_up()
+    try_video('/home/pi/Angry.mp4')
+    fidget(gizmo)
+
+
+def bored(gizmo):  # if boredom gets too high: display sad face and run idle motion
+    log.info('Bored', limit=True)
+    look_up()
+    try_video('/home/pi/Sad.mp4')
+    fidget(gizmo)
+
+
+def idle(gizmo):  # if no other actions occur - call idle motion
+    log.info('Idle', limit=True)
+    try_video('/home/pi/Idle.mp4')
+    look_up()
+    fidget(gizmo)
+
+
+engine = Engine(RULES, {'searching': find_bot, 'lost': lost_protocol, 'resurrect': resurrect, 'die': die,
+                        'busy': busy, 'dance': boombox, 'kick': kick, 'sleep': sleep, 'eat': eat, 'tired': tired,
+                        'hungry': hungry, 'bored': bored, 'idle': idle}, stats)
+
+
+capture = camera.result() if camera else None  # only waits if the webcam is still opening
+startup.mark('waiting for camera')
+
+print('Starting servo, scheduler and LED effects...')
+servo = Servo(s, upDuty, rate=50)  # eases the leg between positions on its own thread
+try:  # from the first thread on, shut everything down however main.py ends - Ctrl-C, a crash or a reload
+    scheduler = Scheduler(['motors'], stats)  # motions run in the background while tracking continues
+    effects = Effects(strip, rate=30)  # LED animations play on their own thread
+    blink_color(strip, blink_times=1, color=(0, 0, 0))  # turn leds off - on at start as standard
+    while True:  # while true loop to run infinitely
+        try:  # except keyboard interrupt, to help quit without failiures
+            if resident.stopping.is_set():  # daemon.py wants to run main.py again - finish here, between frames
+                log.info(' Reloading... ')
+                break
+            loopStart = timer()
+            log.info('Needs', limit=True, count=gizmo.count, hunger=gizmo.hunger, tiredness=gizmo.tiredness, boredom=gizmo.boredom)  # keep track of gizmo's needs in terminal
+            with stats.time('capture'):
+                if pipeline:  # dots already found by the worker processes
+                    frame, found = pipeline.read(maxAge=maxFrameAge)
+                else:
+                    frame = capture.read(maxAge=maxFrameAge, after=frame)  # newest unseen image from webcam, already flipped
+            if frame is None:
+                log.warning('Waiting for camera...', limit=True)
+                continue
+            img = frame.img
+            if not startup.reported:  # log how long each phase of startup took
+                startup.mark('first frame')
+                startup.report()
+
+            # UPDATE COORDS
+            # update coords of gizmo's own dots - the others are only found if a behaviour's guard asks for them
+            with stats.time('detect'):
+                if not pipeline:
+                    found = detector.frame(img)  # each colour/threshold pair is binarised at most once, shared by its dots
+                if robots:  # pair every gizmo's dots, and send every pose and dot to the gizmos without a camera
+                    poses = robots.update(found.all('lBlue'), found.all('sBlue'))
+                    publisher.send(frame.number, poses, dict((target.name, found[target.name]) for target in targets))
+                elif poseSource:
+                    poses = pipeline.poses
+                if robots or poseSource:  # this gizmo is the one with id robotId
+                    pose = poses.get(robotId)
+                    lBlue, sBlue = (pose.coords, pose.small) if pose else (None, None)
+                else:
+                    sBlue = found['sBlue']
+                    lBlue = found['lBlue']
+
+            # MOTORS
+
+            if lBlue and sBlue:  # Gizmo is tracking correctly
+                botCoords = lBlue  # bot coords defined by large blue dot on forehead
+                botVector = (lBlue[0] - sBlue[0], lBlue[1] - sBlue[1])  # calculate vector of gizmo
+                botAngle = round(math.degrees(math.atan2(botVector[1], botVector[0])))  # calculate angle to horizontal
+            gizmo.found = found
+            gizmo.tracked = bool(lBlue and sBlue)
+            gizmo.seen = botCoords is not None
+            gizmo.busy = scheduler.busy('motors')
+            engine.run(gizmo)  # only one behaviour is performed for each camera refresh
+            if recorder:  # written on a background thread - dots nobody asked for are recorded as not found
+                recorder.record(img.getNumpy().copy() if pipeline else img.getNumpy(), frame.timestamp, frame.number,
+                                found.computed())  # pipeline frames are reused shared memory
+
+            # DISPLAY
+
+            if overlay and overlay.due():  # show object tracking to aid troubleshooting - drawn and served off the loop
+                dots = [(coords, colours[name]) for name, coords in found.computed().items() if coords]  # only dots found
+                if robots:  # the other gizmos too
+                    for pose in robots.poses.values():
+                        dots += [(pose.coords, blue), (pose.small, blue)]
+                overlay.submit(img.getNumpy(), dots)
+
+            gizmo.hunger = gizmo.hunger + random.randint(0, 4)  # randomly increase Gizmo's needs as time goes on
+            gizmo.boredom = gizmo.boredom + random.randint(0, 4)
+            gizmo.tiredness = gizmo.tiredness + random.randint(0, 4)
+            gizmo.count = gizmo.count + 1
+            stats.record('loop', timer() - loopStart)
+
+        except KeyboardInterrupt:  # keyboard interrupt handling to prevent errors/crashing upon quit
+            log.info(' Quitting... ')
+            break
+finally:  # otherwise the scheduler, servo and LED threads of a crashed run carry on driving the shared pins
+    if scheduler is not None:
+        scheduler.shutdown()  # cancel running motions before the pins are released
+    servo.shutdown()
+    if effects is not None:
+        effects.shutdown()
+    GPIO.output(25, False)  # turn motors off or they will continue running forever
+    GPIO.output(17, False)
+    GPIO.output(22, False)
+    GPIO.output(23, False)
+    if recorder:
+        recorder.close()  # gives up after a few seconds if the disk is stuck
+    resident.release()  # camera, pins and face players - unless daemon.py is keeping them for the next run
+log.info('Thank you for interacting with Gizmo')  # thank you for reading all the way to the bottom of my code
+log.flush()  # write out anything still buffered before quitting
+quit()
 
 '''
 Once Gizmo was tested in his tiny box and we discovered the split ring was not possible, we realised we would have to
@@ -0,0 +1,203 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# overlay.py: the tracking display, drawn and served off the main loop
+
+# showDisplay used to draw a circle round every dot on the full frame and call img.show() from the main loop, which
+# needed a screen and took long enough to cut the frame rate badly - so tracking could never be watched while gizmo was
+# actually running. The main loop now only asks the Overlay whether a frame is due (at most 'rate' a second) and, if
+# so, hands it a copy of the frame with the dots already found. A background thread draws the circles, encodes a JPEG
+# and serves it as an MJPEG stream (open http://<pi>:8080/ in a browser, or /snapshot.jpg for a single frame) and/or
+# rewrites a snapshot file every few seconds. If it falls behind, the frame waiting to be drawn is replaced by the
+# newer one - frames are dropped, the main loop never waits.
+#
+# JPEGs are encoded with OpenCV (installed alongside SimpleCV) or PIL, whichever is there, imported on the overlay's own
+# thread. Snapshot paths ending in .ppm are written without either.
+
+import os
+import threading
+import time
+
+import numpy  # import numpy
+
+from logger import log
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+BOUNDARY = 'gizmoframe'
+
+
+def jpeg_encoder():  # function turning an RGB array, indexed [y, x], into JPEG bytes - None if nothing can
+    try:
+        import cv2
+        return lambda rgb: cv2.imencode('.jpg', numpy.ascontiguousarray(rgb[:, :, ::-1]))[1].tobytes()
+    except ImportError:
+        pass
+    try:
+        import io
+        from PIL import Image
+
+        def encode(rgb):
+            data = io.BytesIO()
+            Image.fromarray(numpy.ascontiguousarray(rgb)).save(data, 'JPEG', quality=80)
+            return data.getvalue()
+        return encode
+    except ImportError:
+        return None
+
+
+def ppm(rgb):  # RGB array, indexed [y, x], as a binary PPM image
+    return ('P6 %d %d 255\n' % (rgb.shape[1], rgb.shape[0])).encode('ascii') + numpy.ascontiguousarray(rgb).tobytes()
+
+
+def draw_circle(frame, coords, radius, colour, thickness):  # ring round coords, in place - frame indexed [x, y]
+    x, y = int(coords[0]), int(coords[1])
+    reach = radius + thickness
+    x0, x1 = max(0, x - reach), min(frame.shape[0], x + reach + 1)
+    y0, y1 = max(0, y - reach), min(frame.shape[1], y + reach + 1)
+    if x0 >= x1 or y0 >= y1:
+        return
+    xs = numpy.arange(x0, x1).reshape(-1, 1) - x
+    ys = numpy.arange(y0, y1).reshape(1, -1) - y
+    distance = numpy.sqrt(xs * xs + ys * ys)
+    frame[x0:x1, y0:y1][numpy.abs(distance - radius) <= thickness / 2.0] = colour
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        overlay = self.server.overlay
+        if self.path.startswith('/snapshot'):
+            jpeg = overlay.wait(None, 5.0)[1]
+            if jpeg is None:
+                self.send_error(503, 'No frame yet')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        number = None
+        try:
+            while overlay.running:
+                number, jpeg = overlay.wait(number, 5.0)
+                if jpeg is None:
+                    continue
+                self.wfile.write(('--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' %
+                                  (BOUNDARY, len(jpeg))).encode('ascii') + jpeg + b'\r\n')
+        except (IOError, OSError):  # viewer went away
+            pass
+
+    def log_message(self, format, *args):  # not every request on the console
+        log.debug('Overlay request', request=format % args)
+
+
+class Overlay(object):
+    def __init__(self, rate=5, port=None, snapshot=None, interval=5.0, radius=10, thickness=5):
+        self.rate = rate  # frames drawn per second, at most
+        self.port = port  # serve the MJPEG stream on this port
+        self.snapshot = snapshot  # rewrite this file with the latest frame every interval seconds
+        self.interval = interval
+        self.radius = radius  # of the circles drawn round each dot
+        self.thickness = thickness
+        self.condition = threading.Condition()
+        self.pending = None  # (frame, dots) waiting to be drawn
+        self.jpeg = None  # latest frame drawn, encoded
+        self.number = 0  # frames drawn so far
+        self.submitted = 0  # frames handed over by the main loop
+        self.dropped = 0  # frames replaced before they were drawn
+        self.due_at = 0  # next time a frame is wanted
+        self.saved = 0  # time the snapshot was last written
+        self.encode = None
+        self.running = True
+        self.server = None
+        if port:
+            self.server = Server(('', port), Handler)
+            self.server.overlay = self
+            self.start(self.server.serve_forever, 'overlay-http')
+        self.start(self.run, 'overlay')
+
+    def start(self, run, name):
+        thread = threading.Thread(target=run, name=name)
+        thread.daemon = True
+        thread.start()
+
+    def due(self):  # is a frame wanted yet? - cheap enough to ask every loop
+        return time.time() >= self.due_at
+
+    def submit(self, frame, dots):  # copy of a numpy frame (indexed [x, y]) and [((x, y), colour)] to draw on it
+        self.due_at = time.time() + 1.0 / self.rate
+        frame = frame.copy()  # the camera's or the pipeline's buffer may be reused
+        with self.condition:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (frame, dots)
+            self.submitted += 1
+            self.condition.notify_all()
+
+    def wait(self, after, timeout):  # (number, jpeg) of a frame newer than number after, or the latest after timeout
+        deadline = time.time() + timeout
+        with self.condition:
+            while self.running and self.number == after and time.time() < deadline:
+                self.condition.wait(max(0, deadline - time.time()))
+            return self.number, self.jpeg
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def draw(self, frame, dots):  # RGB image, indexed [y, x], with a circle round every dot
+        for coords, colour in dots:
+            draw_circle(frame, coords, self.radius, colour, self.thickness)
+        return frame.transpose(1, 0, 2)
+
+    def save(self, rgb, jpeg):  # write the snapshot file, without readers ever seeing half of it
+        data = ppm(rgb) if self.snapshot.endswith('.ppm') else jpeg
+        if data is None:
+            return
+        with open(self.snapshot + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(self.snapshot + '.tmp', self.snapshot)
+
+    def run(self):
+        self.encode = jpeg_encoder()
+        if self.encode is None and (self.port or not (self.snapshot or '').endswith('.ppm')):
+            log.error('Overlay needs OpenCV or PIL to encode JPEGs')
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame, dots = self.pending
+                self.pending = None
+            try:
+                rgb = self.draw(frame, dots)
+                jpeg = self.encode(rgb) if self.encode is not None else None
+                if self.snapshot and time.time() - self.saved >= self.interval:
+                    self.saved = time.time()
+                    self.save(rgb, jpeg)
+            except Exception as e:  # never take the main loop down with the display
+                log.error('Overlay failed', error=e)
+                continue
+            with self.condition:
+                self.number += 1
+                self.jpeg = jpeg
+                self.condition.notify_all()
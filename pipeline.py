@@ -0,0 +1,211 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# pipeline.py: capture and dot detection spread over the Pi's four cores
+
+# Python threads take turns on one core, so capture, segmenting every colour, blob finding and the behaviour all share
+# it. Pipeline moves them into processes. A capture process writes each flipped frame into one of a few slots of shared
+# memory. Each worker process owns some of the (colour, threshold) pairs from the target table - with its own Detector,
+# so tracking windows carry on working - and segments just those colours from the shared frame. The control process
+# only passes slot numbers around and gets back a handful of coordinates; it reads the frame itself as a numpy view of
+# the slot, without copying it. While the behaviour runs on one frame the workers are already on the next.
+#
+# Slots being worked on or read are marked as held and the capture process never writes into them, so nobody sees a
+# half written frame. Targets named in every are reported as all of their dots too, for several gizmos under one camera.
+# Needs fork (the camera and workers are set up in the child processes), i.e. Linux.
+
+import multiprocessing
+import time
+
+import numpy  # import numpy
+
+from camera import Frame
+from instrument import timer
+from logger import log
+from vision import ArrayImage, Detector, Found, NumpyBackend
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+try:
+    context = multiprocessing.get_context('fork')
+except AttributeError:  # python 2 always forks
+    context = multiprocessing
+
+
+class Pipeline(object):
+    def __init__(self, hw, targets, workers=3, slots=4, size=(640, 480), track=False, pyramid=1, every=(), stats=None):
+        self.hw = hw
+        self.targets = list(targets)
+        self.every = list(every)  # names of targets to find every dot of, not just the largest
+        self.size = size  # frame (width, height) the camera is opened at, and the largest a slot can hold
+        self.track = track
+        self.pyramid = pyramid
+        self.stats = stats  # instrument.Stats - 'vision.wait' and each worker as 'vision.<worker>'
+        keys = []
+        for target in self.targets:
+            if target.key() not in keys:
+                keys.append(target.key())
+        count = max(1, min(workers, len(keys)))
+        self.groups = [[t for t in self.targets if t.key() in keys[i::count]] for i in range(count)]  # per worker
+        frameBytes = size[0] * size[1] * 3
+        self.slots = [context.RawArray('B', frameBytes) for i in range(slots)]  # shared frame buffers
+        self.shapes = context.RawArray('i', 2 * slots)  # width, height per slot
+        self.times = context.RawArray('d', slots)
+        self.numbers = context.RawArray('l', slots)
+        self.held = context.RawArray('b', slots)  # slots the control process is using - not to be overwritten
+        self.latest = context.RawValue('i', -1)  # slot holding the newest frame
+        self.lock = context.Lock()  # choosing a slot to write / taking the latest slot
+        self.captured = context.Event()
+        self.running = context.Event()
+        self.tasks = [context.Queue() for group in self.groups]
+        self.results = context.Queue()
+        self.processes = []
+        self.pending = []  # (slot, number, timestamp) sent to the workers, oldest first
+        self.current = None  # slot of the frame last returned by read()
+        self.dispatched = 0  # number of the newest frame sent to the workers
+
+    def start(self):
+        self.running.set()
+        self.spawn(self.capture, 'capture')
+        for i in range(len(self.groups)):
+            self.spawn(self.work, 'vision%d' % i, i)
+        return self
+
+    def spawn(self, target, name, *args):
+        process = context.Process(target=target, name=name, args=args)
+        process.daemon = True
+        process.start()
+        self.processes.append(process)
+
+    def stop(self):
+        self.running.clear()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+    def view(self, slot):  # the frame in a slot, as a numpy array - no copy
+        width, height = self.shapes[2 * slot], self.shapes[2 * slot + 1]
+        return numpy.frombuffer(self.slots[slot], numpy.uint8, width * height * 3).reshape(width, height, 3)
+
+    # capture process
+
+    def capture(self):
+        cam = self.hw.camera(self.size)  # opened here, so the webcam belongs to this process
+        count = 0
+        while self.running.is_set():
+            try:
+                frame = cam.getImage().flipHorizontal().getNumpy()  # flipped off the control loop, as Capture does
+            except Exception:  # keep capturing through the odd bad read from the webcam
+                time.sleep(0.1)
+                continue
+            timestamp = time.time()
+            if frame.shape[0] * frame.shape[1] * 3 > len(self.slots[0]):
+                log.error('Frame larger than frameSize', limit=True, shape=frame.shape, size=self.size)
+                log.flush()  # the logger's writer thread isn't copied into child processes
+                time.sleep(1)
+                continue
+            with self.lock:  # any slot that is neither held nor the newest frame
+                slot = next((s for s in range(len(self.slots)) if not self.held[s] and s != self.latest.value), None)
+                if slot is not None:
+                    self.held[slot] = 1  # while writing
+            if slot is None:  # control process is behind - drop the frame
+                continue
+            self.shapes[2 * slot], self.shapes[2 * slot + 1] = frame.shape[0], frame.shape[1]
+            self.view(slot)[...] = frame
+            self.times[slot] = timestamp
+            count += 1
+            self.numbers[slot] = count
+            with self.lock:
+                self.held[slot] = 0
+                self.latest.value = slot
+            self.captured.set()
+
+    # worker processes
+
+    def work(self, index):
+        detector = Detector(self.groups[index], NumpyBackend(), track=self.track, pyramid=self.pyramid)
+        tasks = self.tasks[index]
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, number = task
+            start = timer()
+            try:
+                detections = detector.frame(ArrayImage(self.view(slot)))
+                coords = dict((target.name, detections[target.name]) for target in self.groups[index])
+                every = dict((target.name, detections.all(target.name)) for target in self.groups[index]
+                             if target.name in self.every)
+            except Exception as e:  # report nothing found rather than leave the control process waiting
+                coords, every = {}, {}
+                log.error('Vision worker failed', worker=index, error=e)
+                log.flush()
+            self.results.put((index, number, coords, every, timer() - start))
+
+    # control process
+
+    def take(self, after):  # hold the newest slot if it is newer than after - with self.lock held
+        slot = self.latest.value
+        if slot < 0 or self.numbers[slot] <= after:
+            return None
+        self.held[slot] = 1
+        return slot
+
+    def dispatch(self, timeout):  # send the newest unseen frame to every worker
+        deadline = time.time() + timeout
+        while True:
+            self.captured.clear()
+            with self.lock:
+                slot = self.take(self.dispatched)
+            if slot is not None:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self.captured.wait(remaining):
+                return False  # camera has stalled
+        number = self.numbers[slot]
+        self.dispatched = number
+        self.pending.append((slot, number, self.times[slot]))
+        for tasks in self.tasks:
+            tasks.put((slot, number))
+        return True
+
+    def collect(self, number, timeout):  # wait for every worker's coords for one frame
+        found = Found((target.name, None) for target in self.targets)
+        waiting = len(self.groups)
+        deadline = time.time() + timeout
+        while waiting:
+            try:
+                index, done, coords, every, seconds = self.results.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                log.warning('Vision worker is late', limit=True, frame=number)
+                break
+            if done != number:
+                continue  # left over from a frame that timed out
+            found.update(coords)
+            found.every.update(every)
+            waiting -= 1
+            if self.stats is not None:
+                self.stats.record('vision.worker%d' % index, seconds)
+        return found
+
+    def read(self, maxAge=None, timeout=1.0):  # (Frame, vision.Found), or (None, None) if stalled
+        if not self.pending and not self.dispatch(timeout):
+            return None, None
+        self.dispatch(0)  # start the workers on the next frame before waiting for this one, if there is one
+        slot, number, timestamp = self.pending.pop(0)
+        start = timer()
+        found = self.collect(number, timeout)
+        if self.stats is not None:
+            self.stats.record('vision.wait', timer() - start)
+        if self.current is not None and self.current not in [p[0] for p in self.pending]:
+            self.held[self.current] = 0  # finished with the previous frame
+        self.current = slot
+        frame = Frame(ArrayImage(self.view(slot)), timestamp, number)
+        if maxAge is not None and frame.age() > maxAge:
+            return None, None  # too old to act on - the next one will be newer
+        return frame, found
@@ -0,0 +1,184 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# recorder.py: record what gizmo saw and where it thought the dots were, and play it back
+
+# When tracking goes wrong all there is to go on is the print output. The Recorder appends frames, their timestamps
+# and the detected coordinates to a binary log, writing from a background thread so recording can stay on all the
+# time (if the disk falls behind, frames are dropped rather than slowing the loop). Raw 640x480 frames at 15 fps are
+# about 14 MB a second, so only one frame in every 'every' is recorded, and once the log reaches 'limit' bytes it is
+# moved to <path>.1 (replacing the one before) and a new log started - at most twice the limit is ever on the card,
+# holding the most recent frames. If the log can't be written (a bad path, a full card) the error is logged once and
+# recording stops; the loop carries on without it. Every record in a log is the same size, so Replay memory-maps the
+# file as a numpy record array - any frame can be read straight from the page cache without copying or parsing, and
+# handed to the Detector like a camera image.
+#
+# Log layout: 'GIZMOLOG', then version, width, height and number of targets (uint32 each), then each target name
+# padded to 16 bytes, then records of: timestamp (float64), frame number (uint32), x and y per target (int16, -1 if
+# not found) and the raw frame (width x height x 3 uint8, indexed [x, y] like SimpleCV's getNumpy).
+
+import os
+import struct
+import threading
+
+import numpy  # import numpy
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+import hardware
+from logger import log
+
+MAGIC = b'GIZMOLOG'
+VERSION = 1
+NAME_SIZE = 16
+
+
+def record_dtype(width, height, count):  # numpy layout of one record
+    return numpy.dtype([('time', '<f8'), ('number', '<u4'), ('coords', '<i2', (count, 2)),
+                        ('frame', 'u1', (width, height, 3))])
+
+
+def header_size(count):
+    return len(MAGIC) + 16 + NAME_SIZE * count
+
+
+class Recorder(object):
+    def __init__(self, path, names, backlog=8, every=1, limit=None):
+        self.path = path
+        self.names = list(names)  # target names, in the order coords are stored
+        self.queue = queue.Queue(maxsize=backlog)
+        self.every = every  # record one frame in every 'every'
+        self.limit = limit  # bytes - start a new log once this one is this large (None for no limit)
+        self.count = 0  # frames offered to record()
+        self.dropped = 0
+        self.written = 0
+        self.failed = False  # set once a write fails - nothing more is recorded
+        self.file = None
+        self.shape = None
+        self.size = 0  # bytes in the current log
+        self.record_size = 0
+        self.thread = threading.Thread(target=self.run, name='recorder')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, frame, timestamp, number, coords):  # queue one frame - never waits for the disk
+        self.count += 1
+        if self.failed or (self.count - 1) % self.every:
+            return
+        try:
+            self.queue.put_nowait((frame, timestamp, number, coords))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5):  # write whatever is still queued, then close the log - gives up after timeout
+        try:
+            self.queue.put(None, timeout=timeout)  # the writer may have stopped with the queue full
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+
+    def open(self, shape):
+        self.shape = shape
+        self.record_size = record_dtype(shape[0], shape[1], len(self.names)).itemsize
+        self.file = open(self.path, 'wb')
+        self.file.write(MAGIC + struct.pack('<IIII', VERSION, shape[0], shape[1], len(self.names)))
+        for name in self.names:
+            self.file.write(name.encode('ascii')[:NAME_SIZE].ljust(NAME_SIZE, b'\0'))
+        self.size = header_size(len(self.names))
+
+    def rotate(self):  # keep the full log as <path>.1 and start a new one
+        self.file.close()
+        self.file = None
+        os.rename(self.path, self.path + '.1')
+        self.open(self.shape)
+
+    def write(self, frame, timestamp, number, coords):
+        if self.file is None:
+            self.open(frame.shape[:2])
+        if frame.shape[:2] != self.shape:  # every record must be the same size
+            self.dropped += 1
+            return
+        if self.limit and self.size + self.record_size > self.limit and self.size > header_size(len(self.names)):
+            self.rotate()
+        values = []
+        for name in self.names:
+            xy = coords.get(name)
+            values.extend((int(xy[0]), int(xy[1])) if xy else (-1, -1))
+        self.file.write(struct.pack('<dI%dh' % len(values), timestamp, number, *values))
+        self.file.write(numpy.ascontiguousarray(frame, numpy.uint8).tobytes())
+        self.size += self.record_size
+        self.written += 1
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.failed:  # only draining the queue now
+                continue
+            try:
+                self.write(*item)
+            except (IOError, OSError) as e:  # bad path, full card - stop recording, the loop carries on
+                self.failed = True
+                log.error('Recording stopped', path=self.path, error=e)
+        if self.file is not None:
+            try:
+                self.file.close()
+            except (IOError, OSError):  # the last write may not have made it to disk
+                pass
+
+
+class Replay(object):  # zero-copy random access to a recorded log
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(len(MAGIC) + 16)
+            if header[:len(MAGIC)] != MAGIC:
+                raise IOError(path + ' is not a gizmo log')
+            version, width, height, count = struct.unpack('<IIII', header[len(MAGIC):])
+            if version != VERSION:
+                raise IOError('Unknown gizmo log version %d' % version)
+            self.names = [f.read(NAME_SIZE).rstrip(b'\0').decode('ascii') for i in range(count)]
+        self.width = width
+        self.height = height
+        dtype = record_dtype(width, height, count)
+        size = 0
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            size = (f.tell() - header_size(count)) // dtype.itemsize  # ignore a half written last record
+        self.records = numpy.memmap(path, dtype, 'r', header_size(count), (size,)) if size else []
+
+    def __len__(self):
+        return len(self.records)
+
+    def frame(self, i):  # numpy view of frame i - nothing is read until it is used
+        return self.records[i]['frame']
+
+    def image(self, i):  # frame i as an image for the Detector (already flipped, as the main loop saw it)
+        return hardware.to_image(self.frame(i))
+
+    def timestamp(self, i):
+        return float(self.records[i]['time'])
+
+    def coords(self, i):  # {target name: (x, y) or None} as detected when recording
+        found = {}
+        for name, xy in zip(self.names, self.records[i]['coords']):
+            found[name] = (int(xy[0]), int(xy[1])) if xy[0] >= 0 else None
+        return found
+
+
+class LogCamera(object):  # plays a log back as if it were the webcam
+    def __init__(self, path, loop=True):
+        self.replay = Replay(path)
+        self.loop = loop
+        self.index = 0
+
+    def getImage(self):
+        if self.index >= len(self.replay):
+            if not self.loop or len(self.replay) == 0:
+                raise IOError('End of recorded frames')
+            self.index = 0
+        img = hardware.to_image(self.replay.frame(self.index)[::-1])  # logs hold flipped frames - mirror them back
+        self.index += 1
+        return img
@@ -0,0 +1,48 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# resident.py: hardware handles that can outlive one run of main.py
+
+# main.py opens the camera, the PWM pins, the LED strip and the face players itself, and closes them all again when it
+# quits. It opens each of them through keep(name, open, close), and closes them with release(). Run normally that is
+# all it does; run by daemon.py (which sets active) the handles are opened the first time and handed straight back on
+# every later run, and release() leaves them open - so main.py and everything it imports can be reloaded after a crash
+# or a change to the code without waiting for the camera, the LED driver and the face players all over again. To
+# reload, the daemon sets stopping - main.py finishes the frame it is on and tidies up as it does for Ctrl-C.
+
+import collections
+import threading
+
+from logger import log
+
+handles = collections.OrderedDict()  # name: (handle, close) - in the order they were opened
+lock = threading.Lock()
+active = False  # set by daemon.py - keep handles open between runs of main.py
+stopping = threading.Event()  # set by daemon.py - main.py quits its loop at the next frame, to be run again
+
+
+def keep(name, open, close=None):  # the handle called name, opened with open() unless it already is
+    with lock:
+        if name in handles:
+            return handles[name][0]
+    handle = open()  # outside the lock - handles are opened side by side at startup
+    with lock:
+        handles[name] = (handle, close)
+    return handle
+
+
+def release():  # close every handle, newest first - unless the daemon is keeping them for the next run
+    if not active:
+        close_all()
+
+
+def close_all():
+    while True:
+        with lock:
+            if not handles:
+                return
+            name, (handle, close) = handles.popitem()
+        if close is not None:
+            try:
+                close(handle)
+            except Exception as e:  # close the rest anyway
+                log.error('Could not close handle', name=name, error=e)
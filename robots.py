@@ -0,0 +1,170 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# robots.py: poses of several gizmos seen by one overhead camera
+
+# Each gizmo wears a large and a small blue dot, and main.py takes its pose from the largest of each - so a second gizmo
+# in the enclosure would have its dots mixed up with the first's. Robots takes every large and every small dot found in
+# a frame (Detections.all), pairs them into one pose per gizmo - nearest pairs first, as a gizmo's two dots are closer
+# together than any two gizmos can get - and then matches the poses to the gizmos of the last frame in the same way,
+# so each gizmo keeps the same id from frame to frame. One detection pass then serves every gizmo in the enclosure.
+#
+# Given each gizmo's starting position ('homes'), a gizmo gets the id of the home it is first seen nearest to, so the
+# ids mean the same gizmos in every run and to every process. Otherwise ids are handed out in order of first appearance
+# (left to right within a frame). A gizmo that goes missing keeps its id for a few frames; given the number of gizmos in
+# the enclosure (or their homes), it keeps it for good, and reappears as the same gizmo wherever it is next found.
+#
+# Only one Pi has the camera. It finds every gizmo's pose and broadcasts them, with the other dots it found, once a
+# frame (Publisher). The other gizmos run main.py without a camera and take the poses and dots from the broadcast
+# instead (Subscriber, which stands in for the vision pipeline) - so one detection pass drives every gizmo, and they all
+# agree on which gizmo is which.
+
+import json
+import math
+import socket
+import threading
+
+from camera import Frame
+from clock import clock
+from vision import Found
+
+
+class Pose(object):  # where one gizmo is and which way it faces
+    def __init__(self, large, small):
+        self.coords = large  # bot coords defined by large blue dot on forehead
+        self.small = small
+        self.vector = (large[0] - small[0], large[1] - small[1])
+        self.angle = round(math.degrees(math.atan2(self.vector[1], self.vector[0])))  # angle to horizontal
+
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def nearest(first, second, limit=None):  # greedy nearest neighbour assignment - [(i, j)], closest pairs first
+    pairs = sorted((distance(a, b), i, j) for i, a in enumerate(first) for j, b in enumerate(second)
+                   if limit is None or distance(a, b) <= limit)
+    usedFirst, usedSecond, matches = set(), set(), []
+    for d, i, j in pairs:
+        if i not in usedFirst and j not in usedSecond:
+            usedFirst.add(i)
+            usedSecond.add(j)
+            matches.append((i, j))
+    return matches
+
+
+def pair(large, small, limit=150):  # poses from lists of large and small dots - unpaired dots are ignored
+    return [Pose(large[i], small[j]) for i, j in nearest(large, small, limit)]
+
+
+class Robots(object):
+    def __init__(self, count=None, homes=None, pairing=150, jump=100, patience=15):
+        self.homes = [tuple(home) for home in homes or []]  # (x, y) each gizmo starts at - gizmo n starts nearest n
+        self.count = len(self.homes) or count  # gizmos in the enclosure, if known - ids are then never given up
+        self.pairing = pairing  # pixels - furthest apart one gizmo's two dots can be
+        self.jump = jump  # pixels - furthest a gizmo can move between frames and keep its id without help
+        self.patience = patience  # frames a missing gizmo keeps its id, when count isn't known
+        self.last = {}  # id: last pose seen
+        self.missed = {}  # id: frames since last seen
+        self.poses = {}  # id: pose, for the gizmos found in the latest frame
+        self.next = 0
+
+    def update(self, large, small):  # {id: pose} for every gizmo found, from every large and small dot in a frame
+        poses = pair(large, small, self.pairing)
+        ids = list(self.last)
+        found = {}
+        for i, j in nearest([self.last[n].coords for n in ids], [pose.coords for pose in poses], self.jump):
+            found[ids[i]] = poses[j]
+        rest = [pose for pose in poses if pose not in found.values()]
+        unseen = [n for n in range(len(self.homes)) if n not in self.last]
+        for i, j in nearest([self.homes[n] for n in unseen], [pose.coords for pose in rest]):  # first sightings
+            found[unseen[i]] = rest[j]
+        rest = [pose for pose in rest if pose not in found.values()]
+        if self.count is not None and len(ids) + len(unseen) >= self.count:  # all ids given out - the rest went missing
+            missing = [n for n in ids if n not in found]
+            for i, j in nearest([self.last[n].coords for n in missing], [pose.coords for pose in rest]):
+                found[missing[i]] = rest[j]
+            rest = []
+        for pose in sorted(rest, key=lambda pose: pose.coords):  # new gizmos
+            found[self.next] = pose
+            self.next += 1
+        for n in ids:
+            self.missed[n] = 0 if n in found else self.missed[n] + 1
+            if self.count is None and self.missed[n] > self.patience:
+                del self.last[n], self.missed[n]
+        for n, pose in found.items():
+            self.last[n] = pose
+            self.missed[n] = 0
+        self.poses = found
+        return found
+
+    def get(self, n):  # pose of one gizmo in the latest frame, or None if it wasn't found
+        return self.poses.get(n)
+
+
+class Publisher(object):  # broadcasts every gizmo's pose and the other dots found, once a frame
+    def __init__(self, port, address='<broadcast>'):
+        self.address = (address, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def send(self, number, poses, found):  # poses {id: Pose}, found {target name: (x, y) or None}
+        message = {'number': number, 'found': found,
+                   'poses': dict((str(n), [pose.coords, pose.small]) for n, pose in poses.items())}
+        try:
+            self.socket.sendto(json.dumps(message).encode('utf-8'), self.address)
+        except socket.error:  # network down - the gizmos without a camera will wait, this one carries on
+            pass
+
+    def close(self):
+        self.socket.close()
+
+
+class Subscriber(object):  # stands in for pipeline.Pipeline on a gizmo without a camera - the latest broadcast frame
+    def __init__(self, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('', port))
+        self.socket.settimeout(1.0)  # so run() notices stop()
+        self.condition = threading.Condition()
+        self.latest = None  # (message, time received)
+        self.number = None  # number of the frame last returned by read()
+        self.poses = {}  # id: Pose, from the frame last returned by read()
+        self.running = True
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='poses')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.socket.close()
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.socket.recv(65536)
+                message = json.loads(data.decode('utf-8'))
+            except (socket.error, ValueError):  # closed, or a garbled datagram
+                continue
+            with self.condition:
+                self.latest = (message, clock.time())  # the camera's Pi keeps its own time - stamped on arrival
+                self.condition.notify_all()
+
+    def read(self, maxAge=None, timeout=1.0):  # (Frame without an image, vision.Found), or (None, None) if nothing new
+        deadline = clock.time() + timeout
+        with self.condition:
+            while self.latest is None or self.latest[0]['number'] == self.number:
+                remaining = deadline - clock.time()
+                if remaining <= 0:
+                    return None, None
+                self.condition.wait(remaining)
+            message, received = self.latest
+        self.number = message['number']
+        frame = Frame(None, received, message['number'])
+        if maxAge is not None and frame.age() > maxAge:
+            return None, None
+        self.poses = dict((int(n), Pose(tuple(large), tuple(small))) for n, (large, small) in message['poses'].items())
+        found = Found((name, tuple(coords) if coords else None) for name, coords in message['found'].items())
+        return frame, found
@@ -0,0 +1,211 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# scheduler.py: timed motor, servo and LED commands that run in the background
+
+# Every motion helper used to time itself with time.sleep, which froze optical tracking for as long as the motion took
+# (27 seconds while eating). Here a command is a list of (action, hold) steps - call action, then hold for that many
+# seconds - and each actuator has its own channel thread that works through its commands in order. The main loop keeps
+# processing frames while they run, and can cancel a channel at any time when something new is seen. Interruptible
+# commands (turning on the spot between frames) give way to anything submitted after them and don't count as busy.
+#
+# On clock.py's virtual clock a channel has no thread: steps run as soon as they are due, and a hold books the next
+# step with the clock instead of waiting, so simulate.py can run hours of commands in moments. While a hold is booked
+# only the clock (or cancelling the command) moves the channel on - queuing another command just waits its turn.
+
+import collections
+import threading
+
+from clock import clock
+from instrument import timer
+from logger import log
+
+
+class Command(object):
+    def __init__(self, steps, stop=None, name=None, interruptible=False):
+        self.steps = list(steps)  # (action, hold) pairs - action may be None for a plain wait
+        self.stop = stop  # always called at the end, finished or cancelled - e.g. motors_off
+        self.name = name
+        self.interruptible = interruptible
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def duration(self):  # seconds the command takes if it is not cancelled
+        return sum(hold for action, hold in self.steps)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            for action, hold in self.steps:
+                if self.cancelled.is_set():
+                    break
+                if action is not None:
+                    action()
+                if hold > 0 and self.cancelled.wait(hold):  # returns early if cancelled mid-hold
+                    break
+        finally:
+            if self.stop is not None:
+                self.stop()
+            self.done.set()
+
+    def wait(self, timeout=None):  # block until the command has finished (only for shutdown and tests)
+        return self.done.wait(timeout)
+
+
+class Channel(object):  # one actuator - runs its commands one after another on its own thread
+    def __init__(self, name, stats=None):
+        self.name = name
+        self.stats = stats  # instrument.Stats - times each command as '<channel>.<command name>'
+        self.commands = collections.deque()
+        self.current = None
+        self.lock = threading.Condition()
+        self.running = True
+        self.thread = None
+        self.index = 0  # next step of the current command, on the virtual clock
+        self.started = None
+        self.advancing = False
+        self.holding = False  # the current command's hold is booked with the clock
+        if clock.virtual:
+            return  # steps are run by advance() instead
+        self.thread = threading.Thread(target=self.run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, command, preempt=False):  # preempt cancels whatever is running or waiting first
+        with self.lock:
+            if preempt:
+                self.clear()
+            else:
+                self.clear(interruptible=True)
+            self.commands.append(command)
+            self.lock.notify()
+            if self.thread is None and self.ready():
+                self.advance()
+        return command
+
+    def clear(self, interruptible=False):  # cancel running and queued (or just interruptible) commands - hold self.lock
+        for command in list(self.commands):
+            if command.interruptible or not interruptible:
+                command.cancel()
+                command.done.set()  # never started, so there is nothing to stop
+                self.commands.remove(command)
+        if self.current is not None and (self.current.interruptible or not interruptible):
+            self.current.cancel()
+
+    def cancel(self):
+        with self.lock:
+            self.clear()
+            if self.thread is None and self.ready():
+                self.advance()
+
+    def busy(self):  # working on anything that isn't interruptible
+        with self.lock:
+            if self.current is not None and not self.current.interruptible and not self.current.cancelled.is_set():
+                return True
+            return any(not command.interruptible for command in self.commands)
+
+    def shutdown(self):
+        with self.lock:
+            self.running = False
+            self.clear()
+            self.lock.notify()
+            if self.thread is None:
+                if self.ready():
+                    self.advance()
+                return
+        self.thread.join(1)
+
+    def ready(self):  # virtual clock - can steps run now? not while the current command holds, unless it was cancelled
+        return not self.holding or self.current is None or self.current.cancelled.is_set()
+
+    def advance(self):  # virtual clock - run steps until one holds, finishing cancelled commands - hold self.lock
+        if self.advancing:  # a step submitted or cancelled a command - carry on from the loop already running
+            return
+        self.advancing = True
+        self.holding = False
+        try:
+            while self.current is not None or self.commands:
+                if self.current is None:
+                    self.current = self.commands.popleft()
+                    self.index = 0
+                    self.started = clock.time()
+                command = self.current
+                if command.cancelled.is_set() or self.index >= len(command.steps):
+                    self.finish(command)
+                    continue
+                action, hold = command.steps[self.index]
+                self.index += 1
+                try:
+                    if action is not None:
+                        action()
+                except Exception as e:  # as on the thread - the command stops, the channel carries on
+                    log.error('Command failed', channel=self.name, command=command.name, error=e)
+                    command.cancelled.set()
+                if hold > 0 and not command.cancelled.is_set():
+                    clock.at(clock.time() + hold, lambda index=self.index: self.wake(command, index))
+                    self.holding = True
+                    return
+        finally:
+            self.advancing = False
+
+    def wake(self, command, index):  # virtual clock - a hold has ended, unless the command was cancelled meanwhile
+        with self.lock:
+            if self.current is command and self.index == index:
+                self.advance()
+
+    def finish(self, command):  # virtual clock - the end of a command, finished or cancelled
+        try:
+            if command.stop is not None:
+                command.stop()
+        except Exception as e:
+            log.error('Command failed', channel=self.name, command=command.name, error=e)
+        command.done.set()
+        if self.stats is not None:
+            self.stats.record(self.name + '.' + (command.name or 'command'), clock.time() - self.started)
+        self.current = None
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.running and not self.commands:
+                    self.lock.wait()
+                if not self.running:
+                    return
+                self.current = self.commands.popleft()
+            start = timer()
+            try:
+                self.current.run()
+            except Exception as e:  # a broken command must not take the actuator down with it
+                log.error('Command failed', channel=self.name, command=self.current.name, error=e)
+            if self.stats is not None:
+                self.stats.record(self.name + '.' + (self.current.name or 'command'), timer() - start)
+            with self.lock:
+                self.current = None
+
+
+class Scheduler(object):
+    def __init__(self, channels=('motors', 'servo', 'leds'), stats=None):
+        self.channels = {}
+        for name in channels:
+            self.channels[name] = Channel(name, stats)
+
+    def run(self, channel, steps, stop=None, name=None, interruptible=False):  # replace whatever the channel is doing
+        return self.channels[channel].submit(Command(steps, stop, name, interruptible), preempt=True)
+
+    def queue(self, channel, steps, stop=None, name=None, interruptible=False):  # run after the channel's other commands
+        return self.channels[channel].submit(Command(steps, stop, name, interruptible))
+
+    def busy(self, channel=None):  # is this channel (or any channel) still working?
+        if channel is not None:
+            return self.channels[channel].busy()
+        return any(c.busy() for c in self.channels.values())
+
+    def cancel(self, channel=None):  # stop this channel (or every channel) now
+        for name in self.channels:
+            if channel is None or name == channel:
+                self.channels[name].cancel()
+
+    def shutdown(self):
+        for c in self.channels.values():
+            c.shutdown()
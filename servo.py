@@ -0,0 +1,125 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# servo.py: smooth servo motions played on their own thread
+
+# look_up and look_down wrote their duty cycle twice, 0.1 seconds apart, to make sure the leg got there under load,
+# and breathing while asleep stepped between the two positions in tenths. A Servo moves the leg through a motion - a
+# list of (duty, seconds, easing) segments, optionally repeated - working out the duty cycle at a fixed rate on a
+# background thread, so the leg eases in and out of each position instead of jumping and nothing else has to wait for
+# it. A duty cycle is only written when it has changed, and asking to move where the leg already is (or is already
+# going) does nothing - the idle branches call look_up on every frame.
+
+from __future__ import division
+
+import math
+import threading
+
+from instrument import timer
+
+EASING = {
+    'linear': lambda f: f,
+    'in': lambda f: f * f,
+    'out': lambda f: f * (2 - f),
+    'inout': lambda f: (1 - math.cos(math.pi * f)) / 2,
+}
+
+
+class Motion(object):
+    def __init__(self, segments, repeat=1, delay=0):
+        self.segments = [(duty, seconds, EASING[ease]) for duty, seconds, ease in segments]  # (duty, seconds, easing)
+        self.repeat = repeat  # times through the segments - 0 for forever
+        self.delay = delay  # seconds to hold still first
+        self.period = sum(seconds for duty, seconds, ease in self.segments)
+
+    def duration(self):  # seconds from start to finish - None if it repeats forever
+        if not self.repeat:
+            return None
+        return self.delay + self.period * self.repeat
+
+    def target(self):  # where the motion ends up
+        return self.segments[-1][0] if self.repeat else None
+
+    def duty(self, start, t):  # duty cycle t seconds in, starting from start - None once finished
+        t -= self.delay
+        if t < 0:
+            return start
+        duration = self.duration()
+        if duration is not None and t >= duration - self.delay:
+            return None
+        if self.period > 0:
+            if t >= self.period:
+                start = self.segments[-1][0]  # later repeats start from where the first one ended
+            t %= self.period
+        for duty, seconds, ease in self.segments:
+            if t < seconds:
+                return start + (duty - start) * ease(t / seconds)
+            t -= seconds
+            start = duty
+        return start
+
+
+class Servo(object):
+    def __init__(self, pwm, duty, rate=50):
+        self.pwm = pwm
+        self.rate = rate  # duty cycle updates per second while moving
+        self.duty = duty  # last duty cycle written
+        self.motion = None
+        self.start = duty  # duty cycle the current motion started from
+        self.started = None
+        self.writes = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='servo')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def move(self, duty, seconds=0.2, ease='inout'):  # ease to one position - unless already there or on the way
+        with self.condition:
+            target = self.motion.target() if self.motion is not None else self.duty
+            if target is not None and abs(target - duty) < 0.01:
+                return 0
+        return self.play(Motion([(duty, seconds, ease)]))
+
+    def play(self, motion):  # replace the current motion - returns how long the new one takes
+        with self.condition:
+            self.motion = motion
+            self.start = self.duty
+            self.started = timer()
+            self.condition.notify()
+        return motion.duration()
+
+    def stop(self):  # hold where the leg is now
+        with self.condition:
+            self.motion = None
+
+    def busy(self):
+        return self.motion is not None
+
+    def shutdown(self):
+        with self.condition:
+            self.running = False
+            self.motion = None
+            self.condition.notify()
+        self.thread.join(1)
+
+    def write(self, duty):
+        duty = round(duty, 2)  # finer than the servo can resolve
+        if duty != self.duty:
+            self.pwm.ChangeDutyCycle(duty)
+            self.duty = duty
+            self.writes += 1
+
+    def run(self):
+        with self.condition:
+            while self.running:
+                if self.motion is None:
+                    self.condition.wait()
+                    continue
+                tick = int((timer() - self.started) * self.rate)
+                duty = self.motion.duty(self.start, tick / self.rate)
+                if duty is None:  # finished - make sure it ends exactly on target
+                    self.write(self.motion.target())
+                    self.motion = None
+                    continue
+                self.write(duty)
+                self.condition.wait(max(0, self.started + (tick + 1) / self.rate - timer()))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# GIZMO PIXEL - Interactive robotic pet code
+
+# simulate.py: days of gizmo's life in seconds, on a virtual clock
+
+# Hunger, tiredness and boredom grow a little every frame, so dying, being resurrected or getting through a whole
+# day's meals takes hours of watching. This runs main.py itself - its rules, actions, scheduler and needs - on
+# simulated hardware with clock.py switched to virtual time. Each frame moves the clock on by one frame period: the
+# scheduler's holds end as their time comes, a World turns the motor pins into gizmo moving and turning around the
+# enclosure, and an imaginary owner comes by now and then to put in the food bowl, the bed, the ball or the boombox
+# (or the three resurrection dots, once gizmo has died) and take them away again. The dots are reported where they
+# are, without rendering or searching a frame, unless --vision is given. main.py's handles are handed to it through
+# resident.keep, as daemon.py does, along with a few settings (no face, display or stats files) and the State holding
+# gizmo's needs, which the owner looks at to see whether gizmo is dead. Each run starts with no handles left over from
+# an earlier one, and puts the clock and resident state back when it ends. The owner and the needs both draw from one
+# seed, so a run with the same seed and length always turns out the same. The result is how long gizmo spent in each
+# behaviour, how often it started each one, and how much faster than real time it ran:
+#
+#   python simulate.py --days 2 --seed 1
+#   python simulate.py --hours 1 --vision --save run.json
+
+from __future__ import division
+
+import argparse
+import json
+import math
+import os
+import random
+import runpy
+import sys
+
+import resident
+from camera import Frame
+from clock import clock
+from hardware import SceneCamera, SimBackend
+from behaviour import State
+from heading import wrap_angle
+from instrument import Stats, timer
+from targets import TARGETS
+from vision import ArrayImage, Detector, Found, NumpyBackend
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPEED = 7.5  # pixels a second per unit of PWM, driving - move_forward expects 150 pixels a second at speed 20
+TURN = 3.0  # degrees a second per unit of PWM, turning on the spot
+SPACING = 80  # pixels between the centres of gizmo's large and small dots - far enough apart not to touch
+MARGIN = 60  # pixels - nothing is put closer to the edge of the enclosure than this
+EDGE = SPACING + 40  # pixels - closest gizmo's large dot gets to the edge, so the small one stays in view
+OBJECTS = ['ball', 'lGreen', 'xsBlue', 'xsRed']  # ball, bed, boombox and food bowl
+RESURRECTION = ['lGreen', 'xsBlue', 'xsRed']
+SHRINK = 3  # pixels - dilate(2) eats about this far into the edge of every dot, so --vision draws them that much larger
+COLOURS = {'lBlue': (0, 0, 255), 'sBlue': (0, 0, 255), 'xsBlue': (0, 0, 255), 'lGreen': (0, 255, 0),
+           'xsRed': (255, 0, 0), 'ball': (255, 140, 0)}
+SETTINGS = {'showAnimation': False, 'showDisplay': False, 'statsFile': None, 'statsSocket': None, 'recordLog': None,
+            'logFile': None, 'visionWorkers': 1, 'robotCount': 1}  # visionWorkers - main.py reads dots from a pipeline
+
+
+def scene():  # {target name: (colour, area drawn)} - each dot segments to the middle of its target's area band
+    dots = {}
+    for target in TARGETS:
+        radius = math.sqrt((target.minArea + target.maxArea) / 2 / math.pi) + SHRINK
+        dots[target.name] = (COLOURS[target.name], math.pi * radius ** 2)
+    return dots
+
+
+class World(object):  # the enclosure - where gizmo is, what its motors do to it and what the owner puts in
+    def __init__(self, gpio, rng, size=(640, 480), visits=600.0, stay=(20, 120)):
+        self.gpio = gpio
+        self.random = rng
+        self.size = size
+        self.visits = visits  # mean seconds between the owner's visits
+        self.stay = stay  # seconds things are left in the enclosure, at least and at most
+        self.coords = (120.0, size[1] / 2)  # large dot - gizmo starts at the back of the box, facing forwards
+        self.angle = 0.0  # degrees - the direction from small dot to large dot, as main.py measures it
+        self.objects = {}  # target name: (x, y)
+        self.placed = {}  # target name: times put in
+        self.leaving = None  # when the owner takes things away again
+        self.arrival = clock.time() + rng.expovariate(1 / visits)
+
+    def wheel(self, pwm, forward, backward):  # signed PWM of one motor, from the simulated pins
+        duty = self.gpio.pins.get(pwm)
+        duty = duty[1] if isinstance(duty, tuple) else 0
+        if self.gpio.pins.get(forward):
+            return duty
+        if self.gpio.pins.get(backward):
+            return -duty
+        return 0
+
+    def step(self, seconds):  # move gizmo for this long under the current motor outputs
+        right = self.wheel(13, 17, 25)  # as main.py's right() and left() drive them
+        left = self.wheel(12, 22, 23)
+        if not right and not left:
+            return
+        self.angle = wrap_angle(self.angle - TURN * (right - left) / 2 * seconds)  # the way move_angle expects
+        distance = SPEED * (right + left) / 2 * seconds
+        x = self.coords[0] + distance * math.cos(math.radians(self.angle))
+        y = self.coords[1] + distance * math.sin(math.radians(self.angle))
+        self.coords = (min(max(x, EDGE), self.size[0] - EDGE), min(max(y, EDGE), self.size[1] - EDGE))
+
+    def visit(self, dead):  # the owner comes and goes
+        now = clock.time()
+        if self.leaving is not None and now >= self.leaving:
+            self.objects = {}
+            self.leaving = None
+            self.arrival = now + self.random.expovariate(1 / self.visits)
+        elif self.leaving is None and now >= self.arrival:
+            for name in (RESURRECTION if dead else [self.random.choice(OBJECTS)]):
+                self.objects[name] = (self.random.randint(MARGIN, self.size[0] - MARGIN),
+                                      self.random.randint(MARGIN, self.size[1] - MARGIN))
+                self.placed[name] = self.placed.get(name, 0) + 1
+            self.leaving = now + self.random.uniform(*self.stay)
+
+    def dots(self):  # {target name: (x, y) or None} - where everything is
+        x, y = self.coords
+        found = {'lBlue': (int(round(x)), int(round(y))),
+                 'sBlue': (int(round(x - SPACING * math.cos(math.radians(self.angle)))),
+                           int(round(y - SPACING * math.sin(math.radians(self.angle)))))}
+        for name in OBJECTS:
+            found[name] = self.objects.get(name)
+        return found
+
+
+class Tally(Stats):  # main.py's Stats, also adding up the virtual time spent in each behaviour
+    def __init__(self):
+        Stats.__init__(self)
+        self.seconds = {}  # behaviour: virtual seconds
+        self.frames = {}  # behaviour: frames
+        self.starts = {}  # behaviour: times it started, after something else
+        self.current = None  # behaviour run for this frame
+        self.last = None  # behaviour run for the frame before
+
+    def record(self, name, seconds):
+        Stats.record(self, name, seconds)
+        if name.startswith('behaviour.'):
+            self.current = name[len('behaviour.'):]
+
+    def frame(self, period):  # the behaviour chosen for a frame lasts until the next frame
+        name = self.current
+        if name is None:
+            return
+        self.seconds[name] = self.seconds.get(name, 0) + period
+        self.frames[name] = self.frames.get(name, 0) + 1
+        if name != self.last:
+            self.starts[name] = self.starts.get(name, 0) + 1
+        self.last = name
+        self.current = None
+
+
+class Simulation(object):  # stands in for pipeline.Pipeline - every read() is one frame later on the virtual clock
+    def __init__(self, world, tally, gizmo, fps=5, seconds=3600, vision=False):
+        self.world = world
+        self.tally = tally
+        self.gizmo = gizmo  # main.py's State
+        self.period = 1 / fps
+        self.frames = int(seconds * fps)
+        self.number = 0
+        self.scene = None
+        self.detector = None
+        if vision:  # render each frame and find the dots in it, as main.py would
+            self.scene = SceneCamera(world.size[0], world.size[1], fps=0)
+            self.detector = Detector(TARGETS, NumpyBackend(), track=True)
+            self.dots = scene()
+
+    def read(self, maxAge=None, timeout=1.0):  # (Frame, dots) - the frame is None unless finding dots in it
+        if self.number:
+            self.tally.frame(self.period)
+            clock.advance(self.period, self.world.step)  # motor commands start and stop on time meanwhile
+        if self.number >= self.frames:
+            raise KeyboardInterrupt  # main.py quits as it does for Ctrl-C
+        self.world.visit(self.gizmo.dead)
+        self.number += 1
+        found = self.world.dots()
+        if self.scene is None:
+            return Frame(None, clock.time(), self.number), Found(found)
+        for name, (colour, area) in self.dots.items():
+            if found[name] is None:
+                self.scene.remove(name)
+            else:
+                self.scene.place(name, colour, found[name], area)
+        img = ArrayImage(self.scene.render()[::-1])  # flipped back, as the camera's frames are
+        return Frame(img, clock.time(), self.number), self.detector.frame(img)  # dots found as main.py asks
+
+    def stop(self):
+        pass
+
+
+def run(seconds, seed=0, fps=5, visits=600.0, vision=False, verbose=False):
+    random.seed(seed)  # main.py's needs
+    clock.simulate()
+    hw = SimBackend()
+    tally = Tally()
+    gizmo = State()
+    world = World(hw.GPIO, random.Random(seed), visits=visits)
+    simulation = Simulation(world, tally, gizmo, fps, seconds, vision)
+    settings = dict(SETTINGS, logLevel='INFO' if verbose else 'WARNING')
+    resident.close_all()  # nothing left over from an earlier run in this process
+    sys.modules.pop('utils', None)  # utils takes hw from resident.keep when it is imported - import it afresh
+    resident.active = True  # main.py leaves these alone when it quits
+    for name, handle in [('hw', hw), ('stats', tally), ('pipeline', simulation), ('settings', settings),
+                         ('gizmo', gizmo)]:
+        resident.keep(name, lambda handle=handle: handle)
+    stdout = sys.stdout
+    start = timer()
+    try:
+        if not verbose:
+            sys.stdout = open(os.devnull, 'w')  # main.py's 'Importing...' lines
+        runpy.run_path(os.path.join(HERE, 'main.py'), run_name='__main__')
+    except SystemExit:  # main.py quit
+        pass
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+        resident.active = False
+        resident.close_all()  # main.py's pins and the handles given to it - the next run starts afresh
+        clock.real()
+    elapsed = timer() - start
+    simulated = simulation.number * simulation.period
+    behaviours = {}
+    for name in tally.seconds:
+        behaviours[name] = {'seconds': tally.seconds[name], 'share': tally.seconds[name] / max(simulated, 1e-9),
+                            'frames': tally.frames[name], 'starts': tally.starts.get(name, 0)}
+    return {'seed': seed, 'seconds': simulated, 'elapsed': elapsed, 'speedup': simulated / max(elapsed, 1e-9),
+            'frames': simulation.number, 'fps': fps, 'vision': vision, 'placed': world.placed,
+            'behaviours': behaviours}
+
+
+def duration(seconds):
+    return '%d:%02d:%02d' % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def report(results):
+    print('%s simulated in %.1f s (%.0fx real time), %d frames at %g fps, seed %d' % (
+        duration(results['seconds']), results['elapsed'], results['speedup'], results['frames'], results['fps'],
+        results['seed']))
+    print('%-10s %10s %7s %8s %7s' % ('behaviour', 'time', 'share', 'frames', 'starts'))
+    for name, b in sorted(results['behaviours'].items(), key=lambda item: -item[1]['seconds']):
+        print('%-10s %10s %6.1f%% %8d %7d' % (name, duration(b['seconds']), 100 * b['share'], b['frames'],
+                                              b['starts']))
+    print('owner put in: ' + ', '.join('%s %d' % (name, n) for name, n in sorted(results['placed'].items())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run main.py on a virtual clock and report gizmo's behaviour")
+    parser.add_argument('--days', type=float, default=0)
+    parser.add_argument('--hours', type=float, default=0)
+    parser.add_argument('--minutes', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0, help='same seed and length, same run')
+    parser.add_argument('--fps', type=float, default=5, help='frames per simulated second - needs grow every frame')
+    parser.add_argument('--visits', type=float, default=10, help='mean minutes between the owner putting things in')
+    parser.add_argument('--vision', action='store_true', help='render every frame and find the dots in it (slow)')
+    parser.add_argument('--verbose', action='store_true', help="show main.py's output and log")
+    parser.add_argument('--save', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    seconds = args.days * 86400 + args.hours * 3600 + args.minutes * 60 or 3600  # an hour unless told otherwise
+    results = run(seconds, args.seed, args.fps, args.visits * 60, args.vision, args.verbose)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
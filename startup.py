@@ -0,0 +1,76 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# startup.py: how long each part of starting gizmo takes, with the slow independent parts run side by side
+
+# Gizmo used to import everything and then open the camera, the pins, the LEDs and the face players one after another
+# before looking at its first frame. Startup times each phase of that - mark(name) ends the phase running since the last
+# mark - and start(name, function) runs a piece of initialisation that nothing needs straight away (opening the camera,
+# loading the LED driver) on its own thread, timed as well; result() waits for it where it is first needed. report()
+# logs the lot once the first frame has been seen. On python 2 imports still happen one at a time, whichever thread
+# does them, so the saving there is in opening the hardware rather than loading its libraries.
+
+import threading
+
+from instrument import timer
+from logger import log
+
+
+class Task(object):  # one piece of initialisation running on its own thread
+    def __init__(self, startup, name, function, args):
+        self.startup = startup
+        self.name = name
+        self.function = function
+        self.args = args
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='startup-' + name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        start = timer()
+        try:
+            self.value = self.function(*self.args)
+        except Exception as e:  # raised again by result(), in the thread that needs it
+            self.error = e
+        self.startup.record(self.name, timer() - start, True)
+
+    def result(self):  # wait for the task to finish - its return value, or the exception it raised
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Startup(object):
+    def __init__(self):
+        self.started = timer()
+        self.last = self.started  # end of the previous phase
+        self.phases = []  # (name, seconds, ran in the background)
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, name):  # end the phase started at the last mark
+        now = timer()
+        self.record(name, now - self.last, False)
+        self.last = now
+
+    def start(self, name, function, *args):  # run function(*args) in the background - a Task
+        return Task(self, name, function, args)
+
+    def record(self, name, seconds, background):
+        with self.lock:
+            self.phases.append((name, seconds, background))
+
+    def elapsed(self):
+        return timer() - self.started
+
+    def report(self):  # log every phase and the total, once
+        if self.reported:
+            return
+        self.reported = True
+        with self.lock:
+            phases = list(self.phases)
+        for name, seconds, background in phases:
+            log.info('Startup: ' + name, seconds=round(seconds, 3), background=background)
+        log.info('Started', seconds=round(self.elapsed(), 3))
@@ -0,0 +1,35 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# targets.py: the dots gizmo looks for, with the colours, thresholds and areas found by calibration testing
+
+# main.py tracks these dots, bench.py replays recorded frames through the same table and simulate.py draws its scenes
+# from it - kept here so a recalibrated threshold or area band reaches all three.
+
+from vision import Target
+
+green = (0, 255, 0)  # RGB colour values for detection
+gThresh = 170  # binarizing threshold (see below). Values found by calibration testing
+blue = (0, 0, 255)
+bThresh = 150
+orange = (255, 0, 0)
+oThresh = 160
+red = (255, 0, 0)
+rThresh = 150
+
+sBotMin = 1600  # dot areas (in number of pixels) for detection - based on size and distance from camera
+sBotMax = 2800
+lBotMin = 4000
+lBotMax = 7000
+xsFloorMin = 450
+xsFloorMax = 800
+ballMin = 3500
+ballMax = 5500
+
+TARGETS = [  # every dot Gizmo tracks - each found when first asked for, sharing one pass per colour
+    Target('sBlue', blue, bThresh, sBotMin, sBotMax),
+    Target('lBlue', blue, bThresh, lBotMin, lBotMax),
+    Target('xsBlue', blue, bThresh, xsFloorMin, xsFloorMax),
+    Target('lGreen', green, gThresh, xsFloorMin, xsFloorMax),
+    Target('xsRed', red, rThresh, xsFloorMin, xsFloorMax),
+    Target('ball', orange, oThresh, ballMin, ballMax),
+]
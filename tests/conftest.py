@@ -0,0 +1,8 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# conftest.py: lets the tests import gizmo's modules from the directory above, however pytest is run
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_behaviour.py: which rule fires for made up needs and detections
+
+import unittest
+
+from behaviour import Engine, RULES, State
+
+EVERYTHING = {'xsBlue': (100, 100), 'ball': (200, 100), 'lGreen': (300, 100), 'xsRed': (400, 100)}
+
+
+def decide(**needs):
+    return Engine(RULES).decide(State(**needs)).name
+
+
+class RulesTest(unittest.TestCase):
+    def test_tracking(self):
+        self.assertEqual(decide(), 'searching')
+        self.assertEqual(decide(seen=True), 'lost')
+        self.assertEqual(decide(tracked=True, seen=True), 'idle')
+
+    def test_needs(self):
+        self.assertEqual(decide(tracked=True, tiredness=501), 'tired')
+        self.assertEqual(decide(tracked=True, hunger=701), 'hungry')
+        self.assertEqual(decide(tracked=True, boredom=251), 'bored')
+        self.assertEqual(decide(tracked=True, tiredness=501, hunger=701, boredom=251), 'tired')  # checked first
+
+    def test_death(self):
+        self.assertEqual(decide(tracked=True, hunger=1001, tiredness=1001, boredom=1001), 'die')
+        self.assertEqual(decide(tracked=True, dead=True, hunger=1001, tiredness=1001, boredom=1001,
+                                found=dict(EVERYTHING)), 'resurrect')
+
+    def test_objects(self):
+        self.assertEqual(decide(tracked=True, boredom=6, found={'xsBlue': (1, 1)}), 'dance')
+        self.assertEqual(decide(tracked=True, boredom=6, tiredness=600, found=dict(EVERYTHING)), 'kick')
+        self.assertEqual(decide(tracked=True, tiredness=6, found={'lGreen': (1, 1)}), 'sleep')
+        self.assertEqual(decide(tracked=True, hunger=3, found={'xsRed': (1, 1)}), 'eat')
+        self.assertEqual(decide(tracked=True, hunger=3, busy=True, found={'xsRed': (1, 1)}), 'busy')
+
+    def test_actions(self):  # the action of the rule that fired runs, and only that one
+        ran = []
+        engine = Engine(RULES, {'idle': lambda state: ran.append('idle'), 'tired': lambda state: ran.append('tired')})
+        self.assertEqual(engine.run(State(tracked=True)).name, 'idle')
+        self.assertEqual(ran, ['idle'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_blobs.py: components() against a plain flood-fill labeller, and the circle test on known shapes
+
+import math
+import unittest
+
+import numpy  # import numpy
+
+from blobs import components
+
+
+def flood(mask, minSize=10):  # [(area, x, y, circle)] of every 8-connected component - one pixel at a time
+    seen = numpy.zeros(mask.shape, bool)
+    found = []
+    for start in zip(*numpy.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        pixels = []
+        todo = [start]
+        while todo:
+            x, y = todo.pop()
+            pixels.append((x, y))
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < mask.shape[0] and 0 <= ny < mask.shape[1] and mask[nx, ny] and not seen[nx, ny]:
+                        seen[nx, ny] = True
+                        todo.append((nx, ny))
+        if len(pixels) >= minSize:
+            found.append(statistics(numpy.array(pixels, numpy.float64)))
+    return sorted(found)
+
+
+def statistics(pixels):  # (area, x, y, circle) of one component's pixels, worked out directly
+    area = len(pixels)
+    x, y = pixels.mean(axis=0)
+    mu20 = ((pixels[:, 0] - x) ** 2).mean() + 1 / 12.0
+    mu02 = ((pixels[:, 1] - y) ** 2).mean() + 1 / 12.0
+    mu11 = ((pixels[:, 0] - x) * (pixels[:, 1] - y)).mean()
+    major, minor = sorted(numpy.linalg.eigvalsh([[mu20, mu11], [mu11, mu02]]), reverse=True)
+    side = min(numpy.ptp(pixels[:, 0]), numpy.ptp(pixels[:, 1])) + 1
+    circleArea = math.pi * (side / 2) ** 2
+    fill = abs(area - circleArea) / circleArea
+    return (area, x, y, max(fill, math.sqrt(major / max(minor, 1e-12)) - 1))
+
+
+def ellipse(shape, centre, a, b):  # mask of an ellipse with semi-axes a (along axis 0) and b
+    xs, ys = numpy.ogrid[:shape[0], :shape[1]]
+    return ((xs - centre[0]) / a) ** 2 + ((ys - centre[1]) / b) ** 2 <= 1
+
+
+class ComponentsTest(unittest.TestCase):
+    def same(self, mask, minSize=10):
+        result = components(mask, minSize)
+        expected = flood(mask, minSize)
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(list(result['area']), sorted(result['area']))  # smallest first, like findBlobs
+        rows = sorted(tuple(row) for row in result.tolist())
+        for row, want in zip(rows, expected):
+            self.assertEqual(row[0], want[0])
+            for got, value in zip(row[1:], want[1:]):
+                self.assertAlmostEqual(got, value, places=6)
+
+    def test_random(self):  # speckle, with components of every shape touching in every way
+        for seed in range(5):
+            mask = numpy.random.RandomState(seed).rand(60, 50) < 0.45
+            self.same(mask, minSize=1)
+            self.same(mask)
+
+    def test_shapes(self):
+        mask = ellipse((200, 160), (50, 50), 20, 20) | ellipse((200, 160), (140, 60), 30, 20)
+        mask[40:60, 110:130] = True  # square
+        self.same(mask)
+
+    def test_circle(self):  # a disc is round, a 1.5:1 ellipse and a square are not
+        disc = components(ellipse((80, 80), (40, 40), 25, 25))
+        oval = components(ellipse((80, 80), (40, 40), 30, 20))
+        square = numpy.zeros((80, 80), bool)
+        square[20:60, 20:60] = True
+        self.assertLess(disc['circle'][0], 0.05)
+        self.assertAlmostEqual(oval['circle'][0], 0.5, delta=0.05)
+        self.assertAlmostEqual(components(square)['circle'][0], 4 / math.pi - 1, places=6)
+
+    def test_diagonal(self):  # pixels touching only at corners are one component, as in findBlobs
+        mask = numpy.eye(12, dtype=bool)
+        mask[:, 6:] |= numpy.eye(12, dtype=bool)[:, ::-1][:, 6:]
+        self.assertEqual(len(components(mask, minSize=1)), 1)
+        self.same(mask, minSize=1)
+        self.assertEqual(len(components(numpy.eye(12, dtype=bool)[:, ::-1], minSize=1)), 1)
+
+    def test_min_size(self):
+        mask = numpy.zeros((20, 20), bool)
+        mask[2:5, 2:5] = True  # 9 pixels
+        mask[10:14, 10:14] = True  # 16 pixels
+        self.assertEqual(list(components(mask)['area']), [16])
+        self.assertEqual(list(components(mask, minSize=9)['area']), [9, 16])
+        self.assertEqual(len(components(numpy.zeros((20, 20), bool))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_detector.py: tracking windows, growing them, refresh searches and SimpleCV window thresholds
+
+import unittest
+
+import numpy  # import numpy
+
+from hardware import SceneCamera, SimImage
+from simulate import scene
+from targets import TARGETS
+from vision import Detector, NumpyBackend, SimpleCVBackend, Track
+
+BLUE = (0, 0, 255)
+PLACES = {'lBlue': (160, 120), 'sBlue': (320, 120), 'xsBlue': (480, 120), 'lGreen': (160, 360), 'xsRed': (320, 360),
+          'ball': (480, 360)}
+
+
+def image(camera):  # the scene the right way round, as main.py sees it after flipping
+    return SimImage(camera.render()[::-1])
+
+
+class Recording(NumpyBackend):  # remembers the region of every search
+    def __init__(self):
+        NumpyBackend.__init__(self)
+        self.regions = []
+
+    def blobs(self, img, colour, threshold, region=None, iterations=None):
+        self.regions.append(region)
+        return NumpyBackend.blobs(self, img, colour, threshold, region, iterations)
+
+
+class ReferenceImage(object):  # the SimpleCV operations SimpleCVBackend uses, written out in numpy
+    def __init__(self, frame):
+        self.frame = frame
+
+    def getNumpy(self):
+        return self.frame
+
+    def crop(self, x, y, w, h):
+        return ReferenceImage(self.frame[x:x + w, y:y + h])
+
+    def colorDistance(self, colour):  # scaled so the furthest pixel is 255, like SimpleCV
+        distance = numpy.sqrt(((self.frame.astype(numpy.float64) - colour) ** 2).sum(axis=2))
+        return ReferenceImage((distance * (255.0 / distance.max())).astype(numpy.uint8))
+
+    def dilate(self, iterations):
+        grey = self.frame
+        for repeats in range(iterations):
+            padded = numpy.pad(grey, 1, mode='edge')
+            grey = numpy.max([padded[1 + dx:padded.shape[0] - 1 + dx, 1 + dy:padded.shape[1] - 1 + dy]
+                              for dx in (-1, 0, 1) for dy in (-1, 0, 1)], axis=0)
+        return ReferenceImage(grey)
+
+    def binarize(self, threshold, value):
+        return ReferenceImage(numpy.where(self.frame <= threshold, value, 0))
+
+
+class TrackTest(unittest.TestCase):
+    def test_region(self):
+        self.assertEqual(Track((100, 100), 40).region(320, 240), (80, 80, 40, 40))
+        self.assertEqual(Track((5, 230), 40).region(320, 240), (0, 200, 40, 40))  # kept inside the frame
+        self.assertEqual(Track((100, 100), 40).region(320, 240, 400), (0, 0, 320, 240))
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.camera = SceneCamera(320, 240, fps=0)
+        self.camera.place('lBlue', BLUE, (100, 120), 5500)
+        self.backend = Recording()
+        self.detector = Detector(TARGETS, self.backend, track=True, margin=10)
+
+    def test_window(self):  # once found, the dot is only looked for around where it was
+        self.assertEqual(self.detector.frame(image(self.camera))['lBlue'], (100, 120))
+        self.camera.place('lBlue', BLUE, (108, 124), 5500)
+        self.backend.regions = []
+        self.assertEqual(self.detector.frame(image(self.camera))['lBlue'], (108, 124))
+        self.assertEqual(len(self.backend.regions), 1)
+        self.assertEqual(self.backend.regions[0][2], self.detector.window(self.detector.lookup['lBlue']))
+
+    def test_grow(self):  # a dot outside its window is found in one twice the size
+        self.detector.frame(image(self.camera))['lBlue']
+        size = self.detector.tracks['lBlue'].size
+        self.camera.place('lBlue', BLUE, (100 + size // 2 + 20, 120), 5500)
+        self.backend.regions = []
+        self.assertEqual(self.detector.frame(image(self.camera))['lBlue'], (100 + size // 2 + 20, 120))
+        self.assertEqual([region[2] for region in self.backend.regions], [size, min(2 * size, 320)])
+
+    def test_lost(self):  # a dot that has jumped is searched for in the whole frame
+        self.detector = Detector(TARGETS, self.backend, track=True, margin=0, grow=1)
+        self.detector.frame(image(self.camera))['lBlue']
+        self.camera.place('lBlue', BLUE, (250, 60), 5500)
+        self.backend.regions = []
+        self.assertEqual(self.detector.frame(image(self.camera))['lBlue'], (250, 60))
+        self.assertEqual(self.backend.regions[-1], None)
+
+    def test_refresh(self):  # dots not being tracked are only looked for every refresh frames
+        self.camera.remove('lBlue')
+        self.assertIsNone(self.detector.frame(image(self.camera))['lBlue'])
+        self.camera.place('lBlue', BLUE, (100, 120), 5500)
+        found = [self.detector.frame(image(self.camera))['lBlue'] for i in range(self.detector.refresh)]
+        self.assertEqual(found[:-1], [None] * (self.detector.refresh - 1))
+        self.assertEqual(found[-1], (100, 120))
+
+
+class PyramidTest(unittest.TestCase):
+    def check(self, step):  # every target found from a 1/step resolution search
+        camera = SceneCamera(640, 480, fps=0)
+        for name, (colour, area) in scene().items():
+            camera.place(name, colour, PLACES[name], area)
+        found = Detector(TARGETS, NumpyBackend(), pyramid=step).detect(image(camera))
+        for name, coords in PLACES.items():
+            self.assertIsNotNone(found[name], '%s not found at step %d' % (name, step))
+            self.assertLessEqual(max(abs(found[name][0] - coords[0]), abs(found[name][1] - coords[1])), 1)
+
+    def test_half(self):
+        self.check(2)
+
+    def test_quarter(self):
+        self.check(4)
+
+
+class SimpleCVWindowTest(unittest.TestCase):
+    def test_window_threshold(self):  # a window keeps the pixels the full-frame search kept
+        camera = SceneCamera(320, 240, fps=0)
+        camera.place('lBlue', BLUE, (100, 120), 5500)
+        camera.place('haze', (130, 130, 230), (100, 170), 400)  # close to blue by the whole frame's scale only
+        camera.place('xsRed', (255, 0, 0), (250, 60), 800)  # the furthest colour, outside the window
+        img = ReferenceImage(camera.render()[::-1])
+        backend = SimpleCVBackend()
+        full = backend.binarize(img, BLUE, 150).getNumpy()
+        region = Track((100, 140), 120).region(320, 240)
+        window = backend.binarize(img, BLUE, 150, region).getNumpy()
+        expected = full[region[0]:region[0] + region[2], region[1]:region[1] + region[3]]
+        self.assertEqual(window[100 - region[0], 170 - region[1]], 255)
+        inside = (slice(2, -2), slice(2, -2))  # dilate(2) only sees the window's own pixels at its edge
+        self.assertTrue(numpy.array_equal(window[inside], expected[inside]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_face.py: the face's health check never holds up try_video, even when omxplayer hangs
+
+import threading
+import time
+import unittest
+
+from face import Face
+from hardware import SimPlayer
+
+
+class HungPlayer(SimPlayer):  # omxplayer whose D-Bus calls hang until released
+    def __init__(self, path, release, **kw):
+        SimPlayer.__init__(self, path, **kw)
+        self.release = release
+        self.hung = False
+
+    def position(self):
+        if self.hung:
+            self.release.wait(5)
+        return SimPlayer.position(self)
+
+
+class Players(object):  # just enough of a hardware backend for Face
+    def __init__(self):
+        self.release = threading.Event()
+        self.players = []
+
+    def player(self, path, args=None, name=None, pause=False):
+        player = HungPlayer(path, self.release, duration=5.0, args=args, pause=pause)
+        self.players.append(player)
+        return player
+
+
+class FaceTest(unittest.TestCase):
+    def setUp(self):
+        self.hw = Players()
+        self.face = Face(self.hw, prewarm=['Idle.mp4'], check=3600)  # checked by hand below
+        deadline = time.time() + 2
+        while 'Idle.mp4' not in self.face.clips and time.time() < deadline:
+            time.sleep(0.01)
+        self.face.change('Idle.mp4')
+
+    def tearDown(self):
+        self.hw.release.set()
+        self.face.quit()
+
+    def test_check_without_lock(self):
+        self.hw.players[0].hung = True
+        check = threading.Thread(target=self.face.check)
+        check.start()
+        time.sleep(0.1)  # the check is now stuck in position()
+        start = time.time()
+        self.assertTrue(self.face.playing())
+        self.assertLess(time.time() - start, 0.05)
+        self.hw.release.set()
+        check.join(2)
+        self.assertFalse(check.is_alive())
+
+    def test_end_without_lock(self):  # asking omxplayer where it is near the end doesn't hold up change()
+        clip = self.face.current
+        clip.started = time.time() - clip.duration + 0.4  # in the last half second
+        self.hw.players[0].hung = True
+        results = []
+        playing = threading.Thread(target=lambda: results.append(self.face.playing()))
+        playing.start()
+        time.sleep(0.1)  # now stuck in position()
+        start = time.time()
+        self.face.change('Idle.mp4')
+        self.assertLess(time.time() - start, 0.05)
+        self.hw.release.set()
+        playing.join(2)
+        self.assertEqual(results, [True])
+
+    def test_dead_player_restarted(self):
+        self.hw.players[0].quit_called = True  # its process has gone
+        self.face.check()
+        deadline = time.time() + 2
+        while len(self.hw.players) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.hw.players), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
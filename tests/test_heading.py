@@ -0,0 +1,46 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_heading.py: HeadingController's turn speeds
+
+import unittest
+
+from heading import HeadingController, wrap_angle
+
+
+class HeadingTest(unittest.TestCase):
+    def test_wrap_angle(self):
+        self.assertEqual(wrap_angle(190), -170)
+        self.assertEqual(wrap_angle(-190), 170)
+        self.assertEqual(wrap_angle(45), 45)
+
+    def test_deadband(self):
+        heading = HeadingController(deadband=15)
+        self.assertEqual(heading.update(10, now=0), 0)
+        self.assertEqual(heading.update(-14, now=0.1), 0)
+
+    def test_speed_limits(self):
+        heading = HeadingController(kp=0.4, minSpeed=15, maxSpeed=35)
+        self.assertEqual(heading.update(20, now=0), 15)  # 8 is too slow to turn at all
+        heading.reset()
+        self.assertEqual(heading.update(-170, now=1), -35)
+
+    def test_same_sign_as_error(self):  # a big derivative braking the turn never turns gizmo the wrong way
+        heading = HeadingController(kp=0.4, kd=1.0)
+        heading.update(90, now=0, target='ball')
+        speed = heading.update(20, now=0.1, target='ball')  # derivative -700 swamps the proportional 8
+        self.assertEqual(speed, heading.minSpeed)
+        heading.update(-90, now=1, target='bed')
+        self.assertEqual(heading.update(-20, now=1.1, target='bed'), -heading.minSpeed)
+
+    def test_new_target_resets(self):  # the integral and previous error belong to the target they were measured for
+        heading = HeadingController(kp=0.4, ki=1.0)
+        heading.update(60, now=0, target='ball')
+        heading.update(60, now=0.5, target='ball')
+        self.assertEqual(heading.integral, 30)
+        heading.update(60, now=0.6, target='xsRed')
+        self.assertEqual(heading.integral, 0)
+        self.assertEqual(heading.prevTime, 0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
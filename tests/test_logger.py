@@ -0,0 +1,58 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_logger.py: which messages the logger prints and which it counts
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from logger import Logger
+
+
+class LoggerTest(unittest.TestCase):
+    def setUp(self):
+        self.log = Logger(flush=3600)  # nothing is written out while the test looks at the buffer
+
+    def lines(self):
+        return [entry[2] for entry in self.log.recent()]
+
+    def test_repeats_printed(self):  # errors, quitting and startup lines are never swallowed
+        self.log.error('Command failed', error='first')
+        self.log.error('Command failed', error='second')
+        self.log.info(' Quitting... ')
+        self.log.info(' Quitting... ')
+        self.assertEqual(self.lines(), ['Command failed error=first', 'Command failed error=second', ' Quitting... ',
+                                        ' Quitting... '])
+
+    def test_limited_repeats_counted(self):
+        for i in range(4):
+            self.log.info('Idle', limit=True)
+        self.assertEqual(self.lines(), ['Idle'])
+        self.log.repeats['Idle'][0] -= self.log.interval  # as if the interval had passed
+        self.log.info('Idle', limit=True)
+        self.assertEqual(self.lines(), ['Idle', 'Idle (repeated 3 times)'])
+
+    def test_level(self):
+        self.log.configure(level='WARNING')
+        self.log.info('Needs', limit=True)
+        self.log.warning('Waiting for camera...', limit=True)
+        self.assertEqual(self.lines(), ['Waiting for camera...'])
+
+
+    def test_file_kept(self):  # main.py configures the same log file on every reload - it is only opened once
+        directory = tempfile.mkdtemp()
+        try:
+            self.log.configure(path=os.path.join(directory, 'gizmo.txt'))
+            first = self.log.file
+            self.log.configure(path=os.path.join(directory, 'gizmo.txt'))
+            self.assertIs(self.log.file, first)
+            self.log.configure(path=os.path.join(directory, 'other.txt'))
+            self.assertTrue(first.closed)
+            self.log.file.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_recorder.py: recording frames and dots, and reading them back with Replay and LogCamera
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy  # import numpy
+
+from recorder import LogCamera, Recorder, Replay
+
+NAMES = ['lBlue', 'sBlue', 'ball']
+
+
+def frame(i):  # small frame that is different every time
+    return numpy.full((32, 24, 3), i, numpy.uint8)
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'gizmo.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, count, **options):
+        recorder = Recorder(self.path, NAMES, backlog=count + 1, **options)
+        for i in range(count):
+            recorder.record(frame(i), 100.0 + i, i, {'lBlue': (10 + i, 20), 'sBlue': None})  # ball never asked for
+        recorder.close()
+        return recorder
+
+    def test_round_trip(self):
+        self.record(3)
+        replay = Replay(self.path)
+        self.assertEqual(len(replay), 3)
+        self.assertEqual(replay.names, NAMES)
+        self.assertEqual(replay.timestamp(2), 102.0)
+        self.assertEqual(replay.coords(1), {'lBlue': (11, 20), 'sBlue': None, 'ball': None})  # stored as -1
+        self.assertTrue(numpy.array_equal(replay.frame(2), frame(2)))
+
+    def test_truncated(self):  # a record cut short by a crash is ignored
+        self.record(3)
+        with open(self.path, 'ab') as f:
+            f.write(b'\0' * 100)
+        self.assertEqual(len(Replay(self.path)), 3)
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 200)
+        replay = Replay(self.path)
+        self.assertEqual(len(replay), 2)
+        self.assertEqual(replay.coords(1)['lBlue'], (11, 20))
+
+    def test_log_camera(self):  # frames come back mirrored, as the webcam gives them, and loop
+        self.record(2)
+        camera = LogCamera(self.path)
+        images = [camera.getImage() for i in range(3)]
+        self.assertTrue(numpy.array_equal(images[0].getNumpy(), frame(0)[::-1]))
+        self.assertTrue(numpy.array_equal(images[2].getNumpy(), frame(0)))
+        camera = LogCamera(self.path, loop=False)
+        camera.getImage()
+        camera.getImage()
+        self.assertRaises(IOError, camera.getImage)
+
+    def test_every(self):
+        recorder = self.record(6, every=3)
+        self.assertEqual(recorder.written, 2)
+        self.assertEqual([Replay(self.path).timestamp(i) for i in range(2)], [100.0, 103.0])
+
+    def test_limit(self):  # the full log is kept as .1, and the newest frames are in the log itself
+        size = len(frame(0).tobytes()) + 100
+        self.record(5, limit=3 * size)
+        old = Replay(self.path + '.1')
+        new = Replay(self.path)
+        self.assertEqual(len(old) + len(new), 5)
+        self.assertEqual(new.timestamp(len(new) - 1), 104.0)
+        self.assertLessEqual(os.path.getsize(self.path), 3 * size)
+
+    def test_bad_path(self):  # a log that can't be written doesn't stop the loop or hang closing
+        recorder = Recorder(os.path.join(self.directory, 'missing', 'gizmo.log'), NAMES, backlog=4)
+        for i in range(12):
+            recorder.record(frame(i), 100.0 + i, i, {})
+        start = time.time()
+        recorder.close(timeout=1)
+        self.assertLess(time.time() - start, 2)
+        self.assertTrue(recorder.failed)
+        self.assertFalse(recorder.thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
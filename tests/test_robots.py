@@ -0,0 +1,59 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_robots.py: pairing dots into poses, keeping ids, and sharing the poses between gizmos
+
+import unittest
+
+from robots import Publisher, Robots, Subscriber, pair
+
+PORT = 50505
+
+
+class PoseTest(unittest.TestCase):
+    def test_pair(self):
+        poses = pair([(100, 100), (400, 300)], [(410, 370), (30, 100)])
+        self.assertEqual(sorted((pose.coords, pose.small) for pose in poses),
+                         [((100, 100), (30, 100)), ((400, 300), (410, 370))])
+        self.assertEqual([pose.angle for pose in pair([(100, 100)], [(30, 100)])], [0])
+
+    def test_ids_kept(self):
+        robots = Robots(count=2)
+        first = robots.update([(100, 100), (400, 300)], [(30, 100), (330, 300)])
+        moved = robots.update([(110, 100), (405, 310)], [(40, 100), (335, 310)])
+        self.assertEqual(first[0].coords, (100, 100))
+        self.assertEqual(moved[0].coords, (110, 100))
+        self.assertEqual(moved[1].coords, (405, 310))
+
+    def test_homes(self):  # ids come from where each gizmo starts, not from the order they are seen in
+        homes = [(500, 400), (100, 100)]
+        robots = Robots(homes=homes)
+        poses = robots.update([(120, 110)], [(50, 110)])  # only gizmo 1 in view so far
+        self.assertEqual(list(poses), [1])
+        poses = robots.update([(130, 110), (480, 390)], [(60, 110), (410, 390)])
+        self.assertEqual(poses[0].coords, (480, 390))
+        self.assertEqual(poses[1].coords, (130, 110))
+        other = Robots(homes=homes)  # another process, starting later, agrees
+        self.assertEqual(other.update([(480, 390)], [(410, 390)])[0].coords, (480, 390))
+
+
+class ShareTest(unittest.TestCase):
+    def test_broadcast(self):
+        subscriber = Subscriber(PORT).start()
+        publisher = Publisher(PORT, '127.0.0.1')
+        try:
+            poses = Robots(count=2).update([(100, 100), (400, 300)], [(30, 100), (330, 300)])
+            publisher.send(7, poses, {'ball': (250, 250), 'xsRed': None})
+            frame, found = subscriber.read(maxAge=1.0, timeout=2.0)
+            self.assertEqual(frame.number, 7)
+            self.assertIsNone(frame.img)
+            self.assertEqual(found['ball'], (250, 250))
+            self.assertIsNone(found['xsRed'])
+            self.assertEqual(subscriber.poses[1].small, (330, 300))
+            self.assertEqual(subscriber.read(timeout=0.1), (None, None))  # nothing new yet
+        finally:
+            publisher.close()
+            subscriber.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_scheduler.py: commands queued, held and cancelled - on clock.py's virtual clock, and on real threads
+
+import time
+import unittest
+
+from clock import clock
+from scheduler import Scheduler
+
+
+class VirtualTest(unittest.TestCase):
+    def setUp(self):
+        clock.simulate()
+        self.events = []
+        self.scheduler = Scheduler(['motors'])
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+        clock.virtual = False
+
+    def step(self, name):
+        return lambda: self.events.append((name, clock.time()))
+
+    def test_queued_holds(self):  # eat: forward, wait for the video, back - each after the one before has finished
+        self.scheduler.queue('motors', [(self.step('fwd'), 2)], stop=self.step('off'))
+        self.scheduler.queue('motors', [(None, 27)])
+        self.scheduler.queue('motors', [(self.step('back'), 2)], stop=self.step('off'))
+        self.assertEqual(self.events, [('fwd', 0)])
+        self.assertTrue(self.scheduler.busy('motors'))
+        clock.advance(40)
+        self.assertEqual(self.events, [('fwd', 0), ('off', 2), ('back', 29), ('off', 31)])
+        self.assertFalse(self.scheduler.busy('motors'))
+
+    def test_queued_mid_hold(self):  # queuing while a command holds doesn't cut the hold short
+        self.scheduler.queue('motors', [(self.step('spin'), 0.5), (self.step('pause'), 0.5)], stop=self.step('off'))
+        clock.advance(0.2)
+        self.scheduler.queue('motors', [(self.step('drive'), 1)])
+        self.assertEqual(self.events, [('spin', 0)])
+        clock.advance(2)
+        self.assertEqual(self.events, [('spin', 0), ('pause', 0.5), ('off', 1), ('drive', 1)])
+
+    def test_cancel_mid_hold(self):
+        self.scheduler.queue('motors', [(self.step('fwd'), 5)], stop=self.step('off'))
+        self.scheduler.queue('motors', [(self.step('back'), 5)], stop=self.step('off'))
+        clock.advance(1)
+        self.scheduler.cancel('motors')
+        self.assertEqual(self.events, [('fwd', 0), ('off', 1)])
+        clock.advance(10)  # the holds booked before cancelling come to nothing
+        self.assertEqual(self.events, [('fwd', 0), ('off', 1)])
+
+    def test_run_replaces_turn(self):  # each frame's turn replaces the last, even part way through its hold
+        self.scheduler.run('motors', [(self.step('turn'), 0.3)], stop=self.step('off'), interruptible=True)
+        clock.advance(0.1)
+        self.assertFalse(self.scheduler.busy('motors'))
+        self.scheduler.run('motors', [(self.step('turn'), 0.3)], stop=self.step('off'), interruptible=True)
+        clock.advance(1)
+        self.assertEqual([name for name, when in self.events], ['turn', 'off', 'turn', 'off'])
+        self.assertAlmostEqual(self.events[-1][1], 0.4)
+
+
+class ThreadTest(unittest.TestCase):
+    def test_queue_and_cancel(self):
+        events = []
+        scheduler = Scheduler(['motors'])
+        try:
+            scheduler.queue('motors', [(lambda: events.append('fwd'), 0.05)], stop=lambda: events.append('off'))
+            command = scheduler.queue('motors', [(lambda: events.append('wait'), 10)])
+            time.sleep(0.2)
+            self.assertTrue(scheduler.busy('motors'))
+            scheduler.cancel('motors')
+            self.assertTrue(command.wait(1))
+            self.assertEqual(events, ['fwd', 'off', 'wait'])
+            self.assertFalse(scheduler.busy('motors'))
+        finally:
+            scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_simulate.py: runs of main.py on the virtual clock are repeatable, and leave nothing behind
+
+import unittest
+
+import resident
+import simulate
+from clock import clock
+
+
+class SimulateTest(unittest.TestCase):
+    def test_repeatable(self):  # a second run in the same process starts afresh
+        first = simulate.run(120, seed=3)
+        second = simulate.run(120, seed=3)
+        self.assertEqual(first['frames'], 600)
+        self.assertEqual(second['frames'], 600)
+        self.assertTrue(first['behaviours'])
+        self.assertEqual(first['behaviours'], second['behaviours'])
+        self.assertFalse(clock.virtual)
+        self.assertFalse(resident.active)
+        self.assertEqual(len(resident.handles), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
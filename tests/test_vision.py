@@ -0,0 +1,80 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# test_vision.py: NumpyBackend's masks against colorDistance -> dilate(2) -> binarize
+
+# The reference is SimpleCV itself when it is installed, otherwise the same three operations written out in numpy the
+# way SimpleCV does them: Euclidean distance scaled so the furthest pixel is 255 and truncated to uint8, a 3x3 max
+# filter twice, and 255 wherever the result is at or below the threshold. The backends may only differ where the
+# truncation moves a pixel across the threshold.
+
+import unittest
+
+import numpy  # import numpy
+
+from hardware import SceneCamera
+from vision import NumpyBackend, mask_agreement
+
+TOLERANCE = 0.999  # fraction of pixels that have to agree
+COLOURS = [((0, 0, 255), 150), ((0, 255, 0), 170), ((255, 0, 0), 150), ((255, 0, 0), 160)]  # main.py's targets
+
+
+def reference_mask(frame, colour, threshold):  # bool mask, as SimpleCV would make it
+    distance = numpy.sqrt(((frame.astype(numpy.float64) - colour) ** 2).sum(axis=2))
+    scaled = (distance * (255.0 / distance.max())).astype(numpy.uint8)
+    for repeats in range(2):
+        padded = numpy.pad(scaled, 1, mode='edge')
+        scaled = numpy.max([padded[1 + dx:padded.shape[0] - 1 + dx, 1 + dy:padded.shape[1] - 1 + dy]
+                            for dx in (-1, 0, 1) for dy in (-1, 0, 1)], axis=0)
+    return scaled <= threshold
+
+
+def agreement(frame, colour, threshold):
+    try:
+        import SimpleCV  # the real thing, when it is there
+    except ImportError:
+        fast = NumpyBackend().mask(frame, colour, threshold) > 127
+        return numpy.mean(fast == reference_mask(frame, colour, threshold))
+    return mask_agreement(SimpleCV.Image(frame), colour, threshold)
+
+
+def scene(noise, seed=0):  # synthetic enclosure with every kind of dot, plus camera noise
+    camera = SceneCamera(320, 240, fps=0)
+    camera.place('lBlue', (0, 0, 255), (80, 60), 5500)
+    camera.place('sBlue', (0, 0, 255), (150, 60), 2200)
+    camera.place('lGreen', (0, 255, 0), (240, 180), 800)
+    camera.place('xsRed', (255, 0, 0), (60, 190), 800)
+    camera.place('ball', (255, 140, 0), (250, 70), 4500)
+    frame = camera.render().astype(numpy.int32)
+    frame += numpy.random.RandomState(seed).randint(-noise, noise + 1, frame.shape)
+    return numpy.clip(frame, 0, 255).astype(numpy.uint8)
+
+
+class MaskTest(unittest.TestCase):
+    def test_clean_scene(self):
+        frame = scene(0)
+        for colour, threshold in COLOURS:
+            self.assertGreaterEqual(agreement(frame, colour, threshold), TOLERANCE)
+
+    def test_noisy_scene(self):
+        for seed in range(3):
+            frame = scene(40, seed)
+            for colour, threshold in COLOURS:
+                self.assertGreaterEqual(agreement(frame, colour, threshold), TOLERANCE)
+
+    def test_buffers_reused(self):  # same output buffer every frame, and it still matches the reference
+        backend = NumpyBackend()
+        first = backend.mask(scene(20, 0), (0, 0, 255), 150)
+        frame = scene(20, 1)
+        second = backend.mask(frame, (0, 0, 255), 150)
+        self.assertIs(first, second)
+        self.assertGreaterEqual(numpy.mean((second > 127) == reference_mask(frame, (0, 0, 255), 150)), TOLERANCE)
+
+    def test_dots_survive(self):  # the masks keep the dots themselves
+        frame = scene(20)
+        mask = NumpyBackend().mask(frame, (0, 0, 255), 150)
+        self.assertEqual(mask[::-1][80, 60], 255)  # rendered mirrored, like the webcam
+        self.assertEqual(mask[::-1][240, 180], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,380 @@
+# GIZMO PIXEL - Interactive robotic pet code
+
+# vision.py: single pass optical tracking of every dot Gizmo looks for
+
+# main.py's update_coords scanned the image once per dot, and its prevColour cache only helped when the same colour was
+# asked for twice in a row. It also could not tell red and orange apart, as they share an RGB value but use different
+# thresholds.
+# The Detector below is given a table of targets once and then finds all of them in each new image, binarising each
+# distinct (colour, threshold) pair exactly once per frame.
+#
+# Most dots only matter some of the time - the ball once gizmo is bored, the bed once it is tired, the resurrection dots
+# only when it is dead. Detector.frame(img) returns Detections for the image without finding anything; each target is
+# found the first time it is asked for and remembered for the rest of the frame, and colours no target was asked for
+# are never binarised. detect(img) still finds every target, for recording and benchmarking. all(name) finds every dot
+# matching a target rather than just the largest, for several gizmos sharing one camera (see robots.py).
+#
+# Blobs are found as an array of (area, x, y, circle) rows - blobs.components() for numpy masks, or SimpleCV's own
+# findBlobs converted to the same rows - and the circle and area tests run on whole columns at once.
+#
+# The original tracking was adapted from examples on the SimpleCV github and from Practical Computer Vision with
+# SimpleCV: K Demaagd et al. ISBN: 9781449320362. Multiple object tracking, colour, and size differentiation was
+# entirely my own work - Ben Cobley.
+
+import math  # import math
+import numpy  # import numpy
+
+from blobs import components, from_simplecv
+from instrument import timer
+
+
+class Target(object):  # description of one dot to track - colour, binarising threshold, area band and circularity
+    def __init__(self, name, colour, threshold, minArea, maxArea, circularity=0.25):
+        self.name = name
+        self.colour = colour
+        self.threshold = threshold
+        self.minArea = minArea  # dot areas (in number of pixels), exclusive as in the old update_coords
+        self.maxArea = maxArea
+        self.circularity = circularity  # isCircle tolerance - experimented to find 0.25 as optimum
+
+    def key(self):  # targets sharing a key can share one binarised image
+        return (tuple(self.colour), self.threshold)
+
+
+def furthest_distance(frame, colour):  # largest distance from colour in a numpy frame - colorDistance scales it to 255
+    diff = frame.astype(numpy.int32) - colour
+    return math.sqrt((diff * diff).sum(axis=2).max())
+
+
+class SimpleCVBackend(object):  # segmentation using SimpleCV's own image operations, as the old update_coords did
+    # colorDistance scales a crop by the furthest colour inside it, not in the whole frame, so each tracking window's
+    # threshold is rescaled by the ratio of the two - the window keeps the pixels a full-frame search would have kept.
+    iterations = 2  # dilate(2) in update_coords
+
+    def __init__(self):
+        self.full = None  # last image searched whole
+        self.scales = {}  # furthest distance per colour in that image - only worked out once a window needs it
+
+    def window_threshold(self, img, colour, threshold, region):  # threshold for a crop, as the last full image had it
+        if self.full is None:  # no full-frame search yet - nothing to match
+            return threshold
+        key = tuple(colour)
+        if key not in self.scales:
+            self.scales[key] = furthest_distance(self.full.getNumpy(), colour)
+        crop = img.getNumpy()[region[0]:region[0] + region[2], region[1]:region[1] + region[3]]
+        window = furthest_distance(crop, colour)
+        if window == 0:
+            return threshold
+        return min(int(threshold * self.scales[key] / window), 255)
+
+    def binarize(self, img, colour, threshold, region=None, iterations=None):  # region (x, y, w, h) - part of img
+        if region is None:
+            self.full = img
+            self.scales = {}
+        else:
+            threshold = self.window_threshold(img, colour, threshold, region)
+            img = img.crop(region[0], region[1], region[2], region[3])
+        cdimg = img.colorDistance(colour)  # stretch colours so that chosen colour is darker
+        iterations = self.iterations if iterations is None else iterations
+        if iterations:
+            cdimg = cdimg.dilate(iterations)
+        return cdimg.binarize(threshold, 255)  # separate colours darker than threshold from lighter than threshold
+
+    def blobs(self, img, colour, threshold, region=None, iterations=None):  # find 'blobs' - areas of consistent colour
+        return from_simplecv(self.binarize(img, colour, threshold, region, iterations).findBlobs())
+
+    def reduce(self, img, step):  # img at 1/step resolution for the coarse search
+        return img.scale(1.0 / step)
+
+
+class NumpyBackend(object):  # same segmentation done in place on the frame's numpy array, without temporary images
+    # colorDistance scales distances so the furthest pixel is 255, then dilate(2) takes the max over a 3x3 window twice
+    # and binarize keeps pixels at or below the threshold. Scaling and the max filter are both monotonic, so the same
+    # mask comes from dilating the squared distance and comparing it against the threshold scaled back to that frame's
+    # maximum - no square roots, floats or new arrays once the buffers for a frame size exist.
+    def __init__(self, iterations=2):
+        self.iterations = iterations  # dilate(2) in update_coords
+        self.buffers = {}  # working buffers per image shape - full frames and each tracking window size
+        self.masks = {}  # one output buffer per (colour, threshold, shape) so a frame's masks can be held together
+        self.scales = {}  # furthest squared distance per (colour, threshold) in the last full frame
+
+    def allocate(self, shape):  # working buffers for a new image shape
+        if shape not in self.buffers:
+            self.buffers[shape] = (numpy.empty(shape, numpy.int32), numpy.empty(shape, numpy.int32),
+                                   numpy.empty(shape, numpy.int32), numpy.empty(shape, numpy.bool_))
+        return self.buffers[shape]
+
+    def dilate(self, dist, scratch, iterations):  # 3x3 max filter of dist, in place
+        src, dst = dist, scratch
+        for repeats in range(iterations):
+            dst[...] = src  # horizontal pass
+            numpy.maximum(dst[:, 1:], src[:, :-1], out=dst[:, 1:])
+            numpy.maximum(dst[:, :-1], src[:, 1:], out=dst[:, :-1])
+            src[...] = dst  # vertical pass
+            numpy.maximum(src[1:, :], dst[:-1, :], out=src[1:, :])
+            numpy.maximum(src[:-1, :], dst[1:, :], out=src[:-1, :])
+
+    def mask(self, frame, colour, threshold, window=False, iterations=None):  # uint8 mask, 255 where close to colour
+        shape = frame.shape[:2]
+        diff, dist, scratch, below = self.allocate(shape)
+        dist.fill(0)
+        for channel in range(3):  # squared RGB distance to the chosen colour
+            numpy.subtract(frame[:, :, channel], colour[channel], out=diff, dtype=numpy.int32)
+            numpy.multiply(diff, diff, out=diff)
+            numpy.add(dist, diff, out=dist)
+        self.dilate(dist, scratch, self.iterations if iterations is None else iterations)
+        key = (tuple(colour), threshold)
+        if window and key in self.scales:  # windows are scaled as the whole frame was, so thresholds mean the same
+            furthest = self.scales[key]
+        else:
+            furthest = int(dist.max())
+            if not window:
+                self.scales[key] = furthest
+        limit = threshold * threshold * furthest / 65025.0  # (threshold / 255 * furthest distance) squared
+        numpy.less_equal(dist, limit, out=below)
+        if key + (shape,) not in self.masks:
+            self.masks[key + (shape,)] = numpy.empty(shape, numpy.uint8)
+        out = self.masks[key + (shape,)]
+        numpy.multiply(below, 255, out=out, casting='unsafe')
+        return out
+
+    def crop(self, img, region):
+        frame = img.getNumpy()  # indexed [x, y] like SimpleCV coordinates
+        if region is not None:
+            frame = frame[region[0]:region[0] + region[2], region[1]:region[1] + region[3]]
+        return frame
+
+    def binarize(self, img, colour, threshold, region=None, iterations=None):  # drop-in for SimpleCVBackend.binarize
+        import SimpleCV  # only needed to compare against SimpleCV - blobs() doesn't use it
+        return SimpleCV.Image(self.mask(self.crop(img, region), colour, threshold, region is not None, iterations))
+
+    def blobs(self, img, colour, threshold, region=None, iterations=None):  # components of the mask - no SimpleCV
+        return components(self.mask(self.crop(img, region), colour, threshold, region is not None, iterations))
+
+    def reduce(self, img, step):  # every step'th pixel - a view of the frame, nothing is copied
+        return ArrayImage(img.getNumpy()[::step, ::step])
+
+
+class ArrayImage(object):  # just enough of a SimpleCV image around a numpy array for NumpyBackend
+    def __init__(self, frame):
+        self.frame = frame
+        self.width = frame.shape[0]
+        self.height = frame.shape[1]
+
+    def getNumpy(self):
+        return self.frame
+
+
+def mask_agreement(img, colour, threshold):  # fraction of pixels where both backends agree - for calibrating on the Pi
+    reference = SimpleCVBackend().binarize(img, colour, threshold).getGrayNumpy() > 127
+    fast = NumpyBackend().mask(img.getNumpy(), colour, threshold) > 127
+    return numpy.mean(reference == fast)
+
+
+# TRACKING
+# Dots only move a few pixels from one frame to the next (the same assumption stationary_test makes), so once a dot has
+# been found only a window around its last position needs segmenting. The window is sized from the dot's largest
+# allowed area, doubled if the dot is not inside it, and if it is still missing the dot is searched for in the whole
+# frame. Dots that are not being tracked (the ball when nobody has put it down) are only looked for in the full-frame
+# search every 'refresh' frames, which also picks up lighting changes for the window thresholds.
+
+class Track(object):  # last known position of one target
+    def __init__(self, coords, size):
+        self.coords = coords
+        self.size = size  # side of the square search window in pixels
+
+    def region(self, width, height, size=None):  # (x, y, w, h) window centred on coords, kept inside the frame
+        size = size or self.size
+        w = min(size, width)
+        h = min(size, height)
+        x = min(max(int(self.coords[0]) - w // 2, 0), width - w)
+        y = min(max(int(self.coords[1]) - h // 2, 0), height - h)
+        return (x, y, w, h)
+
+
+# PYRAMID
+# Even the extra small floor dots cover hundreds of pixels, so they can be found in an image at half or quarter
+# resolution with the area bands divided to match. With pyramid > 1 the full-frame search runs on the reduced image and
+# only proposes candidates by area - each candidate is then checked and its centre measured at full resolution in a
+# small window, using the same circle and area tests as update_coords. dilate(2) eats two pixels into the edge of every
+# dot, and two pixels of the reduced image are 'step' pixels of the frame - at quarter resolution the extra small dots
+# would be all but gone - so the reduced image is only dilated iterations // step times, and the area band is worked
+# out from the radius each dot would have after that much erosion. 'slack' widens the coarse band, as areas of small
+# blobs are rough after reduction.
+
+class Detector(object):
+    def __init__(self, targets, backend=None, track=False, margin=20, grow=2, refresh=10, pyramid=1, slack=0.25,
+                 stats=None):
+        self.targets = list(targets)
+        self.backend = backend or SimpleCVBackend()
+        self.track = track  # search windows around last known positions instead of the whole frame
+        self.margin = margin  # pixels a dot may move between frames
+        self.grow = grow  # window growth when a dot is not where it was
+        self.refresh = refresh  # frames between forced full-frame searches
+        self.pyramid = pyramid  # full-frame searches run at 1/pyramid resolution
+        self.slack = slack
+        self.stats = stats  # instrument.Stats - times each target as 'detect.<name>'
+        self.tracks = {}
+        self.count = 0
+        self.searched = {}  # frame count of each target's last full-frame search
+        self.lookup = dict((target.name, target) for target in self.targets)
+        self.keys = []  # distinct (colour, threshold) pairs, in table order
+        for target in self.targets:
+            if target.key() not in self.keys:
+                self.keys.append(target.key())
+
+    def find_blobs(self, img, key, region=None, iterations=None):  # binarise once and find 'blobs'
+        return self.backend.blobs(img, key[0], key[1], region, iterations)
+
+    def pick(self, blobs, target, offset=(0, 0)):  # coords of the dot update_coords would choose from these blobs
+        dots = blobs[(blobs['circle'] < target.circularity) & (blobs['area'] > target.minArea) &
+                     (blobs['area'] < target.maxArea)]
+        if len(dots):
+            return (int(round(dots[-1]['x'])) + offset[0], int(round(dots[-1]['y'])) + offset[1])
+        return None
+
+    def window(self, target):  # starting window side for a target - twice the dot's largest diameter plus movement
+        return int(4 * math.sqrt(target.maxArea / math.pi)) + 2 * self.margin
+
+    def search(self, img, target):  # look around the target's last position, growing the window once before giving up
+        track = self.tracks.get(target.name)
+        if track is None:
+            return None
+        size = track.size
+        for attempt in range(2):
+            region = track.region(img.width, img.height, size)
+            coords = self.pick(self.find_blobs(img, target.key(), region), target, region[:2])
+            if coords:
+                return coords
+            if region[2] >= img.width and region[3] >= img.height:
+                break  # window already covers the whole frame
+            size = size * self.grow
+        return None
+
+    def dots(self, img, target, found):  # every dot in the whole frame, sharing blobs between targets of one colour
+        key = target.key()
+        if key not in found:
+            found[key] = self.find_blobs(img, key)
+        blobs = found[key]
+        circleKey = (key, target.circularity)
+        if circleKey not in found:  # targets of the same colour usually share a tolerance too
+            found[circleKey] = blobs[blobs['circle'] < target.circularity]
+        circles = found[circleKey]
+        return circles[(circles['area'] > target.minArea) & (circles['area'] < target.maxArea)]
+
+    def full_search(self, img, target, found):  # search the whole frame for one dot
+        dots = self.dots(img, target, found)
+        if len(dots):
+            return (int(round(dots[-1]['x'])), int(round(dots[-1]['y'])))  # same choice of dot as update_coords
+        return None
+
+    def coarse_search(self, img, target, found):  # the first candidate found at reduced resolution that is confirmed
+        return next(self.confirm(img, target, found), None)
+
+    def coarse_area(self, area):  # area in the reduced image of a dot with this area at full resolution
+        full = self.backend.iterations  # pixels dilation eats into a dot at full resolution
+        step = self.pyramid
+        radius = (math.sqrt(area / math.pi) + full) / step - full // step  # as drawn, reduced, then eroded
+        return math.pi * max(radius, 0) ** 2
+
+    def confirm(self, img, target, found):  # find candidates at reduced resolution, yield those confirmed at full
+        key = target.key()
+        step = self.pyramid
+        if 'small' not in found:
+            found['small'] = self.backend.reduce(img, step)
+        if key not in found:
+            found[key] = self.find_blobs(found['small'], key, iterations=self.backend.iterations // step)
+        blobs = found[key]
+        minArea = self.coarse_area(target.minArea) * (1 - self.slack)  # area thresholds for the reduced image
+        maxArea = self.coarse_area(target.maxArea) * (1 + self.slack)
+        candidates = blobs[(blobs['area'] > minArea) & (blobs['area'] < maxArea)]
+        for blob in candidates[::-1]:  # last first, matching update_coords' choice of dots[-1]
+            region = Track((blob['x'] * step, blob['y'] * step), self.window(target)).region(img.width, img.height)
+            coords = self.pick(self.find_blobs(img, key, region), target, region[:2])
+            if coords:
+                yield coords
+
+    def find_all(self, img, target, found):  # coords of every dot matching target, largest first - always whole frame
+        start = timer()
+        if self.pyramid > 1:
+            coords = []
+            for dot in self.confirm(img, target, found):
+                if dot not in coords:  # neighbouring candidates' windows can confirm the same dot
+                    coords.append(dot)
+        else:
+            coords = [(int(round(dot['x'])), int(round(dot['y']))) for dot in self.dots(img, target, found)[::-1]]
+        if self.stats is not None:
+            self.stats.record('detect.%s.all' % target.name, timer() - start)
+        return coords
+
+    def locate(self, img, target, full, found):  # coords of one target - found holds blobs shared within the frame
+        start = timer()
+        coords = None
+        tracked = target.name in self.tracks
+        if not full and tracked:
+            coords = self.search(img, target)
+        # not seen recently - wait for the next full-frame search, unless it has been skipped since the last one
+        if coords is None and (full or tracked or self.count - self.searched.get(target.name, -self.refresh) >=
+                               self.refresh):  # full-frame search, shared by every target of this colour and threshold
+            self.searched[target.name] = self.count
+            if self.pyramid > 1:
+                coords = self.coarse_search(img, target, found)
+            else:
+                coords = self.full_search(img, target, found)
+        if coords is None:
+            self.tracks.pop(target.name, None)
+        elif self.track:
+            self.tracks[target.name] = Track(coords, self.window(target))
+        if self.stats is not None:
+            self.stats.record('detect.' + target.name, timer() - start)
+        return coords
+
+    def frame(self, img):  # Detections for a new image - nothing is searched for until it is asked for
+        full = not self.track or self.count % self.refresh == 0
+        self.count += 1
+        return Detections(self, img, full)
+
+    def detect(self, img):  # return {target name: (x, y) or None} for every target in one pass over the image
+        detections = self.frame(img)
+        return dict((target.name, detections[target.name]) for target in self.targets)
+
+
+class Detections(object):  # one frame's targets, each found the first time it is asked for
+    def __init__(self, detector, img, full):
+        self.detector = detector
+        self.img = img
+        self.full = full  # whole frame search this frame, rather than tracking windows
+        self.found = {}  # blobs and circles already found in this frame
+        self.coords = {}  # target name: (x, y) or None, for the targets asked for so far
+        self.every = {}  # target name: [(x, y), ...], for the targets all() was asked for
+
+    def __getitem__(self, name):
+        if name not in self.coords:
+            self.coords[name] = self.detector.locate(self.img, self.detector.lookup[name], self.full, self.found)
+        return self.coords[name]
+
+    def __contains__(self, name):
+        return name in self.detector.lookup
+
+    def get(self, name, default=None):
+        return self[name] if name in self.detector.lookup else default
+
+    def all(self, name):  # every dot matching a target - for several gizmos under one camera
+        if name not in self.every:
+            self.every[name] = self.detector.find_all(self.img, self.detector.lookup[name], self.found)
+        return self.every[name]
+
+    def computed(self):  # {target name: (x, y) or None} for just the targets that were asked for
+        return dict(self.coords)
+
+
+class Found(dict):  # targets found somewhere else (the pipeline's workers), looked up like Detections
+    def __init__(self, coords, every=None):
+        dict.__init__(self, coords)
+        self.every = every if every is not None else {}  # target name: [(x, y), ...]
+
+    def all(self, name):
+        return self.every.get(name, [])
+
+    def computed(self):
+        return dict(self)